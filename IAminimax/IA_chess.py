@@ -1,298 +1,1626 @@
 
-import pygame
 import sys
 import time
+import random
+import threading
+import multiprocessing
 import math
 import copy
+import json
+import mmap
+import os
+import re
+import struct
+try:
+    import pygame
+except ImportError:
+    # Only the GUI needs pygame; the engine and the command-line tools run without it.
+    pygame = None
 
 START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w"
 
 PIECE_VALUES = {'p':100, 'n':320, 'b':330, 'r':500, 'q':900, 'k':20000}
 
+# Piece-square bonuses from White's side, listed a8..h8 down to a1..h1 like board[r][c].
+PIECE_SQUARE_TABLES = {
+    'p': [  0,  0,  0,  0,  0,  0,  0,  0,
+           50, 50, 50, 50, 50, 50, 50, 50,
+           10, 10, 20, 30, 30, 20, 10, 10,
+            5,  5, 10, 25, 25, 10,  5,  5,
+            0,  0,  0, 20, 20,  0,  0,  0,
+            5, -5,-10,  0,  0,-10, -5,  5,
+            5, 10, 10,-20,-20, 10, 10,  5,
+            0,  0,  0,  0,  0,  0,  0,  0],
+    'n': [-50,-40,-30,-30,-30,-30,-40,-50,
+          -40,-20,  0,  0,  0,  0,-20,-40,
+          -30,  0, 10, 15, 15, 10,  0,-30,
+          -30,  5, 15, 20, 20, 15,  5,-30,
+          -30,  0, 15, 20, 20, 15,  0,-30,
+          -30,  5, 10, 15, 15, 10,  5,-30,
+          -40,-20,  0,  5,  5,  0,-20,-40,
+          -50,-40,-30,-30,-30,-30,-40,-50],
+    'b': [-20,-10,-10,-10,-10,-10,-10,-20,
+          -10,  0,  0,  0,  0,  0,  0,-10,
+          -10,  0,  5, 10, 10,  5,  0,-10,
+          -10,  5,  5, 10, 10,  5,  5,-10,
+          -10,  0, 10, 10, 10, 10,  0,-10,
+          -10, 10, 10, 10, 10, 10, 10,-10,
+          -10,  5,  0,  0,  0,  0,  5,-10,
+          -20,-10,-10,-10,-10,-10,-10,-20],
+    'r': [  0,  0,  0,  0,  0,  0,  0,  0,
+            5, 10, 10, 10, 10, 10, 10,  5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+           -5,  0,  0,  0,  0,  0,  0, -5,
+            0,  0,  0,  5,  5,  0,  0,  0],
+    'q': [-20,-10,-10, -5, -5,-10,-10,-20,
+          -10,  0,  0,  0,  0,  0,  0,-10,
+          -10,  0,  5,  5,  5,  5,  0,-10,
+           -5,  0,  5,  5,  5,  5,  0, -5,
+            0,  0,  5,  5,  5,  5,  0, -5,
+          -10,  5,  5,  5,  5,  5,  0,-10,
+          -10,  0,  5,  0,  0,  0,  0,-10,
+          -20,-10,-10, -5, -5,-10,-10,-20],
+    'k': [-30,-40,-40,-50,-50,-40,-40,-30,
+          -30,-40,-40,-50,-50,-40,-40,-30,
+          -30,-40,-40,-50,-50,-40,-40,-30,
+          -30,-40,-40,-50,-50,-40,-40,-30,
+          -20,-30,-30,-40,-40,-30,-30,-20,
+          -10,-20,-20,-20,-20,-20,-20,-10,
+           20, 20,  0,  0,  0,  0, 20, 20,
+           20, 30, 10,  0,  0, 10, 30, 20],
+}
+
+# Squares are numbered r*8 + c, so square 0 is a8 and square 63 is h1, matching board[r][c].
+# Weights written by tune.py; when the file exists they replace the hand-set values and tables above.
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+EVAL_WEIGHTS_PATH = os.path.join(MODULE_DIR, 'eval_weights.json')
+
+def load_eval_weights(path):
+    with open(path) as f:
+        weights = json.load(f)
+    for p, value in weights.get('piece_values', {}).items():
+        PIECE_VALUES[p] = int(value)
+    for p, table in weights.get('piece_square_tables', {}).items():
+        if len(table) != 64:
+            raise ValueError(f"{path}: table for {p!r} needs 64 entries")
+        PIECE_SQUARE_TABLES[p] = [int(v) for v in table]
+
+if os.path.exists(EVAL_WEIGHTS_PATH):
+    load_eval_weights(EVAL_WEIGHTS_PATH)
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_CHARS = 'pnbrqk'
+COLOR_CHARS = 'wb'
+# A piece code is color*6 + type; it indexes Board.bitboards.
+PIECE_NAMES = [c + p for c in COLOR_CHARS for p in PIECE_CHARS]
+CODE_COLOR = [code // 6 for code in range(12)]
+CODE_TYPE = [code % 6 for code in range(12)]
+TYPE_VALUES = [PIECE_VALUES[p] for p in PIECE_CHARS]
+SQUARE_RC = [divmod(sq, 8) for sq in range(64)]
+# PIECE_SQUARE[code][sq]: material plus placement from White's point of view;
+# Black reads the White table mirrored vertically (sq ^ 56) and negated.
+PIECE_SQUARE = ([[PIECE_VALUES[p] + PIECE_SQUARE_TABLES[p][sq] for sq in range(64)] for p in PIECE_CHARS] +
+                [[-PIECE_VALUES[p] - PIECE_SQUARE_TABLES[p][sq ^ 56] for sq in range(64)] for p in PIECE_CHARS])
+PROMOTION_RANKS = 0xFF000000000000FF
+
+KNIGHT_DELTAS = [(2,1),(2,-1),(-2,1),(-2,-1),(1,2),(1,-2),(-1,2),(-1,-2)]
+KING_DELTAS = [(dr,dc) for dr in (-1,0,1) for dc in (-1,0,1) if dr or dc]
+# The first four directions increase the square index, the last four decrease it.
+RAY_DIRECTIONS = [(0,1),(1,0),(1,1),(1,-1),(0,-1),(-1,0),(-1,-1),(-1,1)]
+ROOK_DIRECTIONS = (0, 1, 4, 5)
+BISHOP_DIRECTIONS = (2, 3, 6, 7)
+
+def _leaper_table(deltas):
+    table = []
+    for sq in range(64):
+        r, c = SQUARE_RC[sq]
+        bb = 0
+        for dr, dc in deltas:
+            nr, nc = r+dr, c+dc
+            if 0 <= nr < 8 and 0 <= nc < 8:
+                bb |= 1 << (nr*8 + nc)
+        table.append(bb)
+    return table
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        r, c = SQUARE_RC[sq]
+        bb = 0
+        nr, nc = r+dr, c+dc
+        while 0 <= nr < 8 and 0 <= nc < 8:
+            bb |= 1 << (nr*8 + nc)
+            nr += dr; nc += dc
+        table.append(bb)
+    return table
+
+KNIGHT_ATTACKS = _leaper_table(KNIGHT_DELTAS)
+KING_ATTACKS = _leaper_table(KING_DELTAS)
+# PAWN_ATTACKS[color][sq]: squares a pawn of that color on sq attacks.
+PAWN_ATTACKS = [_leaper_table([(-1,-1),(-1,1)]), _leaper_table([(1,-1),(1,1)])]
+RAYS = [_ray_table(dr, dc) for dr, dc in RAY_DIRECTIONS]
+
+def slider_attacks(sq, occ, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occ
+        if blockers:
+            if d < 4:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+def rook_attacks(sq, occ):
+    return slider_attacks(sq, occ, ROOK_DIRECTIONS)
+
+def bishop_attacks(sq, occ):
+    return slider_attacks(sq, occ, BISHOP_DIRECTIONS)
+
+ALL_SQUARES = (1 << 64) - 1
+ALL_MOVES, TACTICAL_MOVES, QUIET_MOVES = 0, 1, 2
+
+# Moves are ints: from square in bits 0-5, to square in bits 6-11, promotion piece type
+# in bits 12-14 (0 for none) and a capture flag in bit 15. Tuples ((sr, sc), (tr, tc), promo)
+# only exist at the GUI boundary, through move_to_tuple and Board.move_from_tuple.
+PROMO_MASK = 7 << 12
+CAPTURE_FLAG = 1 << 15
+TACTICAL_MASK = CAPTURE_FLAG | PROMO_MASK
+NULL_MOVE = 0
+PROMOTION_TYPES = (QUEEN, ROOK, BISHOP, KNIGHT)
+UNDO_CAPACITY = 256
+
+def move_to_tuple(move):
+    promo = (move >> 12) & 7
+    return (SQUARE_RC[move & 63], SQUARE_RC[(move >> 6) & 63], PIECE_CHARS[promo] if promo else None)
+# BETWEEN[a][b]: squares strictly between two aligned squares.
+# RAY_THROUGH[a][b]: the whole ray from a that passes through b, which is where a piece pinned on it may go.
+BETWEEN = [[0] * 64 for _ in range(64)]
+RAY_THROUGH = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _d in range(8):
+        _ray = RAYS[_d][_sq]
+        _bb = _ray
+        while _bb:
+            _lsb = _bb & -_bb
+            _t = _lsb.bit_length() - 1
+            BETWEEN[_sq][_t] = _ray ^ RAYS[_d][_t] ^ _lsb
+            RAY_THROUGH[_sq][_t] = _ray
+            _bb ^= _lsb
+ROOK_RAYS = [rook_attacks(sq, 0) for sq in range(64)]
+BISHOP_RAYS = [bishop_attacks(sq, 0) for sq in range(64)]
+
+# Fixed seed so every process (and every saved table or book) agrees on the keys.
+_zobrist_rng = random.Random(0x5EED)
+ZOBRIST_PIECES = [[_zobrist_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_rng.getrandbits(64)
+
+def iter_squares(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+class BoardView:
+    # Read-only board[r][c] view of the bitboards, kept for the GUI.
+    def __init__(self, squares):
+        self.squares = squares
+
+    def __len__(self):
+        return 8
+
+    def __getitem__(self, r):
+        if not 0 <= r < 8:
+            raise IndexError(r)
+        return [PIECE_NAMES[p] if p is not None else '' for p in self.squares[r*8:r*8+8]]
+
+
 class Board:
     def __init__(self):
-        self.board = [['' for _ in range(8)] for __ in range(8)]
+        self.bitboards = [0] * 12
+        self.occupied = [0, 0]
+        self.squares = [None] * 64
+        self.kings = [None, None]
         self.white_to_move = True
-        self.move_stack = [] 
+        self.hash = 0
+        self.score = 0
         self.set_start_position()
 
+    @property
+    def board(self):
+        return BoardView(self.squares)
+
+    def clear_history(self):
+        # Undo records live in preallocated lists indexed by self.ply, grown by doubling.
+        self.ply = 0
+        self.undo_moves = [NULL_MOVE] * UNDO_CAPACITY
+        self.undo_captured = [None] * UNDO_CAPACITY
+        self.undo_hash = [0] * UNDO_CAPACITY
+        self.undo_score = [0] * UNDO_CAPACITY
+
+    def grow_history(self):
+        # Doubles the lists; a clone's, cut at its ply, get at least UNDO_CAPACITY more.
+        n = max(len(self.undo_moves), UNDO_CAPACITY)
+        self.undo_moves.extend([NULL_MOVE] * n)
+        self.undo_captured.extend([None] * n)
+        self.undo_hash.extend([0] * n)
+        self.undo_score.extend([0] * n)
+
+    def played_moves(self):
+        return self.undo_moves[:self.ply]
+
+    def move_from_tuple(self, move):
+        # The legal move matching ((sr, sc), (tr, tc), promo), or None.
+        (sr, sc), (tr, tc), promo = move
+        promo_type = PIECE_CHARS.index(promo) if promo else 0
+        for m in self.all_moves():
+            if m & 63 == sr*8 + sc and (m >> 6) & 63 == tr*8 + tc and (m >> 12) & 7 == promo_type:
+                return m
+        return None
+
+    def put_piece(self, sq, code):
+        bit = 1 << sq
+        self.bitboards[code] |= bit
+        self.occupied[CODE_COLOR[code]] |= bit
+        self.squares[sq] = code
+        if CODE_TYPE[code] == KING:
+            self.kings[CODE_COLOR[code]] = sq
+        self.hash ^= ZOBRIST_PIECES[code][sq]
+        self.score += PIECE_SQUARE[code][sq]
+
     def set_start_position(self):
-        fen, side = START_FEN.split(' w') if ' w' in START_FEN else (START_FEN, 'w')
-        fen = START_FEN.split()[0]
-        rows = fen.split('/')
-        for r in range(8):
-            row = rows[r]
+        self.set_fen(START_FEN)
+
+    def set_fen(self, fen):
+        # Placement and side to move; castling, en passant and the move counters are checked
+        # for syntax and ignored, as the Board has neither castling nor en passant.
+        # Raises ValueError and leaves the board unchanged on a malformed position.
+        fields = fen.split()
+        if not 1 <= len(fields) <= 6:
+            raise ValueError(f"FEN needs 1 to 6 fields: {fen!r}")
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f"FEN needs 8 ranks: {fields[0]!r}")
+        pieces = []
+        for r, row in enumerate(rows):
             c = 0
             for ch in row:
-                if ch.isdigit():
+                if ch in '12345678':
                     c += int(ch)
-                else:
-                    color = 'w' if ch.isupper() else 'b'
-                    piece = ch.lower()
-                    self.board[r][c] = color + piece
+                elif ch.lower() in PIECE_CHARS:
+                    if c < 8:
+                        pieces.append((r*8 + c, (WHITE if ch.isupper() else BLACK)*6 + PIECE_CHARS.index(ch.lower())))
                     c += 1
-        self.white_to_move = (START_FEN.split()[1] == 'w') if len(START_FEN.split()) > 1 else True
+                else:
+                    raise ValueError(f"bad character {ch!r} in FEN rank {8 - r}")
+            if c != 8:
+                raise ValueError(f"FEN rank {8 - r} has {c} squares: {row!r}")
+        side = fields[1] if len(fields) > 1 else 'w'
+        if side not in ('w', 'b'):
+            raise ValueError(f"bad side to move {side!r}")
+        if len(fields) > 2 and (fields[2] != '-' and not set(fields[2]) <= set('KQkq')):
+            raise ValueError(f"bad castling field {fields[2]!r}")
+        if len(fields) > 3 and fields[3] != '-' and not (len(fields[3]) == 2 and fields[3][0] in 'abcdefgh'
+                                                         and fields[3][1] in '36'):
+            raise ValueError(f"bad en passant field {fields[3]!r}")
+        if any(not f.isdigit() for f in fields[4:]):
+            raise ValueError(f"bad move counters {' '.join(fields[4:])!r}")
+        for color in (WHITE, BLACK):
+            kings = sum(code == color*6 + KING for _, code in pieces)
+            if kings != 1:
+                raise ValueError(f"{'no' if kings == 0 else 'more than one'} {COLOR_CHARS[color]}k")
+        if any(CODE_TYPE[code] == PAWN and (PROMOTION_RANKS >> sq) & 1 for sq, code in pieces):
+            raise ValueError("pawn on the first or last rank")
+
+        board = Board.__new__(Board)
+        board.bitboards = [0] * 12
+        board.occupied = [0, 0]
+        board.squares = [None] * 64
+        board.kings = [None, None]
+        board.hash = 0
+        board.score = 0
+        board.clear_history()
+        for sq, code in pieces:
+            board.put_piece(sq, code)
+        board.white_to_move = side == 'w'
+        if not board.white_to_move:
+            board.hash ^= ZOBRIST_BLACK_TO_MOVE
+        if board.king_attacked(BLACK if board.white_to_move else WHITE):
+            raise ValueError("the side not to move is in check")
+        self.__dict__.update(board.__dict__)
+
+    def fen(self):
+        rows = []
+        for r in range(8):
+            row, empty = '', 0
+            for code in self.squares[r*8:r*8 + 8]:
+                if code is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                ch = PIECE_CHARS[CODE_TYPE[code]]
+                row += ch.upper() if CODE_COLOR[code] == WHITE else ch
+            rows.append(row + (str(empty) if empty else ''))
+        return f"{'/'.join(rows)} {'w' if self.white_to_move else 'b'}"
 
     def clone(self):
-        b = Board()
-        b.board = [row.copy() for row in self.board]
+        b = Board.__new__(Board)
+        b.bitboards = self.bitboards.copy()
+        b.occupied = self.occupied.copy()
+        b.squares = self.squares.copy()
+        b.kings = self.kings.copy()
         b.white_to_move = self.white_to_move
-        b.move_stack = self.move_stack.copy()
+        b.hash = self.hash
+        b.score = self.score
+        b.ply = self.ply
+        # Only the records in use; make_move grows the lists again when it needs room.
+        ply = self.ply
+        b.undo_moves = self.undo_moves[:ply]
+        b.undo_captured = self.undo_captured[:ply]
+        b.undo_hash = self.undo_hash[:ply]
+        b.undo_score = self.undo_score[:ply]
         return b
 
     def in_bounds(self, r, c):
         return 0 <= r < 8 and 0 <= c < 8
 
     def is_empty(self, r, c):
-        return self.in_bounds(r, c) and self.board[r][c] == ''
+        return self.in_bounds(r, c) and self.squares[r*8 + c] is None
 
     def piece_at(self, r, c):
-        return self.board[r][c] if self.in_bounds(r, c) else None
+        if not self.in_bounds(r, c):
+            return None
+        p = self.squares[r*8 + c]
+        return PIECE_NAMES[p] if p is not None else ''
 
     def make_move(self, move):
-        (sr, sc), (tr, tc), promo = move
-        moving = self.board[sr][sc]
-        captured = self.board[tr][tc]
-        self.board[tr][tc] = moving
-        self.board[sr][sc] = ''
-        if promo and moving[1] == 'p' and (tr == 0 or tr == 7):
-            self.board[tr][tc] = moving[0] + promo
+        frm = move & 63
+        to = (move >> 6) & 63
+        promo = (move >> 12) & 7
+        moving = self.squares[frm]
+        captured = self.squares[to]
+        color = CODE_COLOR[moving]
+        fbit = 1 << frm
+        tbit = 1 << to
+        bbs = self.bitboards
+        h = self.hash
+        score = self.score
+        ply = self.ply
+        if ply == len(self.undo_moves):
+            self.grow_history()
+        self.undo_moves[ply] = move
+        self.undo_captured[ply] = captured
+        self.undo_hash[ply] = h
+        self.undo_score[ply] = score
+        self.ply = ply + 1
+        if captured is not None:
+            bbs[captured] ^= tbit
+            self.occupied[CODE_COLOR[captured]] ^= tbit
+            h ^= ZOBRIST_PIECES[captured][to]
+            score -= PIECE_SQUARE[captured][to]
+        placed = color*6 + promo if promo else moving
+        bbs[moving] ^= fbit
+        bbs[placed] |= tbit
+        self.occupied[color] ^= fbit | tbit
+        self.squares[frm] = None
+        self.squares[to] = placed
+        if moving == placed and CODE_TYPE[moving] == KING:
+            self.kings[color] = to
+        self.hash = h ^ ZOBRIST_PIECES[moving][frm] ^ ZOBRIST_PIECES[placed][to] ^ ZOBRIST_BLACK_TO_MOVE
+        self.score = score - PIECE_SQUARE[moving][frm] + PIECE_SQUARE[placed][to]
         self.white_to_move = not self.white_to_move
-        self.move_stack.append(((sr, sc), (tr, tc), moving, captured, promo))
 
     def undo_move(self):
-        if not self.move_stack: return
-        (sr, sc), (tr, tc), moving, captured, promo = self.move_stack.pop()
-        self.board[sr][sc] = moving
-        self.board[tr][tc] = captured
+        if not self.ply: return
+        ply = self.ply = self.ply - 1
+        move = self.undo_moves[ply]
+        self.hash = self.undo_hash[ply]
+        self.score = self.undo_score[ply]
+        self.white_to_move = not self.white_to_move
+        if move == NULL_MOVE:
+            return
+        frm = move & 63
+        to = (move >> 6) & 63
+        placed = self.squares[to]
+        color = CODE_COLOR[placed]
+        # A promoted piece goes back to being the pawn that moved.
+        moving = color*6 + PAWN if move & PROMO_MASK else placed
+        captured = self.undo_captured[ply]
+        fbit = 1 << frm
+        tbit = 1 << to
+        bbs = self.bitboards
+        bbs[placed] ^= tbit
+        bbs[moving] |= fbit
+        self.occupied[color] ^= fbit | tbit
+        if captured is not None:
+            bbs[captured] |= tbit
+            self.occupied[CODE_COLOR[captured]] |= tbit
+        self.squares[frm] = moving
+        self.squares[to] = captured
+        if moving == placed and CODE_TYPE[moving] == KING:
+            self.kings[color] = frm
+
+    def make_null_move(self):
+        # Passes the turn, for null-move pruning; undone by undo_move like any other move.
+        ply = self.ply
+        if ply == len(self.undo_moves):
+            self.grow_history()
+        self.undo_moves[ply] = NULL_MOVE
+        self.undo_captured[ply] = None
+        self.undo_hash[ply] = self.hash
+        self.undo_score[ply] = self.score
+        self.ply = ply + 1
+        self.hash ^= ZOBRIST_BLACK_TO_MOVE
         self.white_to_move = not self.white_to_move
 
+    def last_move_was_null(self):
+        return self.ply > 0 and self.undo_moves[self.ply - 1] == NULL_MOVE
+
+    def has_non_pawn_material(self, color):
+        bbs = self.bitboards
+        base = color * 6
+        return bool(bbs[base + KNIGHT] | bbs[base + BISHOP] | bbs[base + ROOK] | bbs[base + QUEEN])
+
     def all_moves(self):
-        color = 'w' if self.white_to_move else 'b'
-        moves = []
-        for r in range(8):
-            for c in range(8):
-                p = self.board[r][c]
-                if p != '' and p[0] == color:
-                    piece_type = p[1]
-                    moves.extend(self.piece_moves(r, c, piece_type, color))
+        return self.generate_moves(ALL_MOVES)
 
-        legal = []
-        for m in moves:
-            self.make_move(m)
+    def tactical_moves(self):
+        # Legal captures and promotions only, for quiescence search.
+        return self.generate_moves(TACTICAL_MOVES)
+
+    def quiet_moves(self):
+        return self.generate_moves(QUIET_MOVES)
 
-            if not self.is_in_check(color):
-                legal.append(m)
-            self.undo_move()
-        return legal
+    def check_info(self):
+        # (checkers, pinned) for the side to move, shared by every generation stage of a node.
+        color = WHITE if self.white_to_move else BLACK
+        ksq = self.kings[color]
+        if ksq is None:
+            return (0, 0)
+        occ = self.occupied[0] | self.occupied[1]
+        return (self.attackers_to(ksq, color ^ 1, occ), self.pinned_pieces(ksq, color, occ))
 
+    def moves_and_status(self):
+        # One legal generation gives both the moves and whether the game is over.
+        info = self.check_info()
+        moves = self.generate_moves(ALL_MOVES, info)
+        if moves:
+            return moves, None
+        return moves, 'checkmate' if info[0] else 'stalemate'
+
+    def generate_moves(self, stage=ALL_MOVES, info=None):
+        # Legal moves straight from the checkers and pins of this node: no make/undo per candidate.
+        color = WHITE if self.white_to_move else BLACK
+        own = self.occupied[color]
+        squares = self.squares
+        ksq = self.kings[color]
+        if ksq is None:
+            moves = []
+            while own:
+                lsb = own & -own
+                sq = lsb.bit_length() - 1
+                own ^= lsb
+                moves.extend(self.square_moves(sq, CODE_TYPE[squares[sq]], color, stage))
+            return moves
+
+        moves = self.king_moves(stage)
+        checkers, pinned = info if info is not None else self.check_info()
+        if checkers & (checkers - 1):
+            return moves
+        if checkers:
+            mask = checkers | BETWEEN[ksq][checkers.bit_length() - 1]
+        else:
+            mask = ALL_SQUARES
+        pieces = own ^ (1 << ksq)
+        while pieces:
+            lsb = pieces & -pieces
+            sq = lsb.bit_length() - 1
+            pieces ^= lsb
+            m = mask & RAY_THROUGH[ksq][sq] if pinned & lsb else mask
+            moves.extend(self.square_moves(sq, CODE_TYPE[squares[sq]], color, stage, m))
+        return moves
+
+    def king_moves(self, stage=ALL_MOVES):
+        color = WHITE if self.white_to_move else BLACK
+        enemy = color ^ 1
+        ksq = self.kings[color]
+        occ = self.occupied[0] | self.occupied[1]
+        moves = []
+        theirs = self.occupied[enemy]
+        targets = KING_ATTACKS[ksq] & self.stage_targets(color, stage)
+        occ ^= 1 << ksq
+        while targets:
+            lsb = targets & -targets
+            t = lsb.bit_length() - 1
+            if not self.square_attacked(t, enemy, occ):
+                moves.append(ksq | t << 6 | (CAPTURE_FLAG if theirs & lsb else 0))
+            targets ^= lsb
+        return moves
+
+    def is_legal(self, move, info=None):
+        # Cheap check for a move from outside the generator, such as a table move.
+        sq = move & 63
+        code = self.squares[sq]
+        color = WHITE if self.white_to_move else BLACK
+        if code is None or CODE_COLOR[code] != color:
+            return False
+        ksq = self.kings[color]
+        if sq == ksq:
+            return move in self.king_moves()
+        if ksq is None:
+            return move in self.square_moves(sq, CODE_TYPE[code], color)
+        checkers, pinned = info if info is not None else self.check_info()
+        if checkers & (checkers - 1):
+            return False
+        mask = checkers | BETWEEN[ksq][checkers.bit_length() - 1] if checkers else ALL_SQUARES
+        if (pinned >> sq) & 1:
+            mask &= RAY_THROUGH[ksq][sq]
+        return move in self.square_moves(sq, CODE_TYPE[code], color, ALL_MOVES, mask)
+
+    def pinned_pieces(self, ksq, color, occ):
+        bbs = self.bitboards
+        base = (color ^ 1) * 6
+        queens = bbs[base + QUEEN]
+        snipers = (ROOK_RAYS[ksq] & (bbs[base + ROOK] | queens)) | (BISHOP_RAYS[ksq] & (bbs[base + BISHOP] | queens))
+        own = self.occupied[color]
+        pinned = 0
+        while snipers:
+            lsb = snipers & -snipers
+            blockers = BETWEEN[ksq][lsb.bit_length() - 1] & occ
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+            snipers ^= lsb
+        return pinned
 
     def piece_moves(self, r, c, piece, color):
+        return self.square_moves(r*8 + c, PIECE_CHARS.index(piece), COLOR_CHARS.index(color))
+
+    def stage_targets(self, color, stage):
+        if stage == ALL_MOVES:
+            return ~self.occupied[color]
+        if stage == TACTICAL_MOVES:
+            return self.occupied[color ^ 1]
+        return ~(self.occupied[0] | self.occupied[1])
+
+    def square_moves(self, sq, ptype, color, stage=ALL_MOVES, mask=ALL_SQUARES):
         moves = []
-        enemy = 'b' if color == 'w' else 'w'
-        if piece == 'p':
-            dir = -1 if color == 'w' else 1
-            start = 6 if color == 'w' else 1
-            if self.in_bounds(r+dir, c) and self.board[r+dir][c] == '':
-                if (r+dir == 0) or (r+dir == 7):
-                    for promo in ['q','r','b','n']:
-                        moves.append(((r,c),(r+dir,c),promo))
-                else:
-                    moves.append(((r,c),(r+dir,c),None))
-                    
-                    if r == start and self.board[r+2*dir][c] == '':
-                        moves.append(((r,c),(r+2*dir,c),None))
-            for dc in (-1,1):
-                nr, nc = r+dir, c+dc
-                if self.in_bounds(nr,nc) and self.board[nr][nc] != '' and self.board[nr][nc][0] == enemy:
-                    if (nr == 0) or (nr == 7):
-                        for promo in ['q','r','b','n']:
-                            moves.append(((r,c),(nr,nc),promo))
-                    else:
-                        moves.append(((r,c),(nr,nc),None))
-        elif piece == 'n':
-            for dr,dc in [(2,1),(2,-1),(-2,1),(-2,-1),(1,2),(1,-2),(-1,2),(-1,-2)]:
-                nr, nc = r+dr, c+dc
-                if not self.in_bounds(nr,nc): continue
-                if self.board[nr][nc] == '' or self.board[nr][nc][0] == enemy:
-                    moves.append(((r,c),(nr,nc),None))
-        elif piece == 'b' or piece == 'r' or piece == 'q':
-            dirs = []
-            if piece in ('b','q'):
-                dirs += [(-1,-1),(-1,1),(1,-1),(1,1)]
-            if piece in ('r','q'):
-                dirs += [(-1,0),(1,0),(0,-1),(0,1)]
-            for dr,dc in dirs:
-                nr, nc = r+dr, c+dc
-                while self.in_bounds(nr,nc):
-                    if self.board[nr][nc] == '':
-                        moves.append(((r,c),(nr,nc),None))
-                    else:
-                        if self.board[nr][nc][0] == enemy:
-                            moves.append(((r,c),(nr,nc),None))
-                        break
-                    nr += dr; nc += dc
-        elif piece == 'k':
-            for dr in (-1,0,1):
-                for dc in (-1,0,1):
-                    if dr==0 and dc==0: continue
-                    nr, nc = r+dr, c+dc
-                    if not self.in_bounds(nr,nc): continue
-                    if self.board[nr][nc] == '' or self.board[nr][nc][0] == enemy:
-                        moves.append(((r,c),(nr,nc),None))
+        own = self.occupied[color]
+        enemy = self.occupied[color ^ 1]
+        occ = own | enemy
+        allowed = self.stage_targets(color, stage) & mask
+        if ptype == PAWN:
+            step = -8 if color == WHITE else 8
+            to = sq + step
+            targets = PAWN_ATTACKS[color][sq] & enemy if stage != QUIET_MOVES else 0
+            if not (occ >> to) & 1:
+                # Promotions count as tactical moves, other pushes as quiet ones.
+                if stage == ALL_MOVES or (stage == TACTICAL_MOVES) == bool((PROMOTION_RANKS >> to) & 1):
+                    targets |= 1 << to
+                start = 6 if color == WHITE else 1
+                if stage != TACTICAL_MOVES and sq >> 3 == start and not (occ >> (to + step)) & 1:
+                    targets |= 1 << (to + step)
+            targets &= mask
+            if targets & PROMOTION_RANKS:
+                for t in iter_squares(targets):
+                    base = sq | t << 6 | (CAPTURE_FLAG if (enemy >> t) & 1 else 0)
+                    for promo in PROMOTION_TYPES:
+                        moves.append(base | promo << 12)
+                return moves
+        elif ptype == KNIGHT:
+            targets = KNIGHT_ATTACKS[sq] & allowed
+        elif ptype == BISHOP:
+            targets = bishop_attacks(sq, occ) & allowed
+        elif ptype == ROOK:
+            targets = rook_attacks(sq, occ) & allowed
+        elif ptype == QUEEN:
+            targets = (bishop_attacks(sq, occ) | rook_attacks(sq, occ)) & allowed
+        else:
+            targets = KING_ATTACKS[sq] & allowed
+        while targets:
+            lsb = targets & -targets
+            moves.append(sq | (lsb.bit_length() - 1) << 6 | (CAPTURE_FLAG if enemy & lsb else 0))
+            targets ^= lsb
         return moves
 
     def find_king(self, color):
-        for r in range(8):
-            for c in range(8):
-                if self.board[r][c] == color + 'k':
-                    return (r,c)
-        return None
+        ksq = self.kings[COLOR_CHARS.index(color)]
+        return SQUARE_RC[ksq] if ksq is not None else None
 
-    def is_in_check(self, color):
-        king_pos = self.find_king(color)
-        if not king_pos: return False
-        kr,kc = king_pos
-        enemy = 'b' if color == 'w' else 'w'
-        pawn_row = kr + (1 if enemy == 'w' else -1)
-        for dc in (-1, 1):
-            r = pawn_row
-            c = kc + dc
-            if self.in_bounds(r, c) and self.board[r][c] == enemy + 'p':
-                return True
-
-        for dr,dc in [(2,1),(2,-1),(-2,1),(-2,-1),(1,2),(1,-2),(-1,2),(-1,-2)]:
-            r,c = kr+dr, kc+dc
-            if self.in_bounds(r,c) and self.board[r][c] == enemy + 'n':
-                return True
-
-        for dr,dc in [(-1,0),(1,0),(0,-1),(0,1)]:
-            nr, nc = kr+dr, kc+dc
-            while self.in_bounds(nr,nc):
-                p = self.board[nr][nc]
-                if p != '':
-                    if p[0] == enemy and (p[1]=='r' or p[1]=='q'):
-                        return True
-                    break
-                nr += dr; nc += dc
-        for dr,dc in [(-1,-1),(-1,1),(1,-1),(1,1)]:
-            nr, nc = kr+dr, kc+dc
-            while self.in_bounds(nr,nc):
-                p = self.board[nr][nc]
-                if p != '':
-                    if p[0] == enemy and (p[1]=='b' or p[1]=='q'):
-                        return True
-                    break
-                nr += dr; nc += dc
-        for dr in (-1,0,1):
-            for dc in (-1,0,1):
-                if dr==0 and dc==0: continue
-                r,c = kr+dr, kc+dc
-                if self.in_bounds(r,c) and self.board[r][c] == enemy+'k':
-                    return True
+    def attackers_to(self, sq, by, occ):
+        bbs = self.bitboards
+        base = by * 6
+        queens = bbs[base + QUEEN]
+        return ((PAWN_ATTACKS[by ^ 1][sq] & bbs[base + PAWN]) |
+                (KNIGHT_ATTACKS[sq] & bbs[base + KNIGHT]) |
+                (KING_ATTACKS[sq] & bbs[base + KING]) |
+                (rook_attacks(sq, occ) & (bbs[base + ROOK] | queens)) |
+                (bishop_attacks(sq, occ) & (bbs[base + BISHOP] | queens)))
+
+    def square_attacked(self, sq, by, occ=None):
+        bbs = self.bitboards
+        base = by * 6
+        if PAWN_ATTACKS[by ^ 1][sq] & bbs[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & bbs[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & bbs[base + KING]:
+            return True
+        if occ is None:
+            occ = self.occupied[0] | self.occupied[1]
+        queens = bbs[base + QUEEN]
+        if rook_attacks(sq, occ) & (bbs[base + ROOK] | queens):
+            return True
+        if bishop_attacks(sq, occ) & (bbs[base + BISHOP] | queens):
+            return True
         return False
 
+    def king_attacked(self, color):
+        ksq = self.kings[color]
+        if ksq is None: return False
+        return self.square_attacked(ksq, color ^ 1)
+
+    def is_in_check(self, color):
+        return self.king_attacked(COLOR_CHARS.index(color))
+
     def evaluate(self):
+        # Maintained incrementally by put_piece, make_move and undo_move.
+        return self.score
+
+    def full_evaluate(self):
         score = 0
-        for r in range(8):
-            for c in range(8):
-                p = self.board[r][c]
-                if p != '':
-                    val = PIECE_VALUES[p[1]]
-                    if p[0] == 'w': score += val
-                    else: score -= val
+        for sq, p in enumerate(self.squares):
+            if p is not None:
+                score += PIECE_SQUARE[p][sq]
         return score
 
     def game_over(self):
-        moves = self.all_moves()
-        if len(moves) == 0:
-            if self.is_in_check('w' if self.white_to_move else 'b'):
-                return 'checkmate'
-            else:
-                return 'stalemate'
+        return self.moves_and_status()[1]
+
+    def san(self, move):
+        # The legal move in standard algebraic notation, as PGN writes it: Nbd7, exd5, e8=Q+.
+        frm, to = move & 63, (move >> 6) & 63
+        ptype = CODE_TYPE[self.squares[frm]]
+        capture = 'x' if move & CAPTURE_FLAG else ''
+        if ptype == PAWN:
+            promo = (move >> 12) & 7
+            text = (square_name(frm)[0] + capture if capture else '') + square_name(to)
+            if promo:
+                text += '=' + PIECE_CHARS[promo].upper()
+        else:
+            # File, rank or both, whichever tells this piece from the others of its type that can go there.
+            rivals = [m & 63 for m in self.all_moves()
+                      if (m >> 6) & 63 == to and m & 63 != frm and CODE_TYPE[self.squares[m & 63]] == ptype]
+            origin = square_name(frm)
+            if not rivals:
+                origin = ''
+            elif all(r & 7 != frm & 7 for r in rivals):
+                origin = origin[0]
+            elif all(r >> 3 != frm >> 3 for r in rivals):
+                origin = origin[1]
+            text = PIECE_CHARS[ptype].upper() + origin + capture + square_name(to)
+        self.make_move(move)
+        moves, status = self.moves_and_status()
+        check = self.king_attacked(WHITE if self.white_to_move else BLACK)
+        self.undo_move()
+        return text + ('#' if status == 'checkmate' else '+' if check else '')
+
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+# Rough CPython cost of one filled slot: the list pointer, the entry tuple and its key int.
+TT_ENTRY_BYTES = 128
+
+class TranspositionTable:
+    def __init__(self, size_mb=64):
+        self.size_mb = size_mb
+        self.size = max(1, int(size_mb * 1024 * 1024) // TT_ENTRY_BYTES)
+        self.clear()
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key):
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
         return None
 
+    def store(self, key, depth, flag, score, move):
+        i = key % self.size
+        entry = self.entries[i]
+        if entry is not None:
+            if entry[0] == key:
+                if move is None:
+                    move = entry[4]
+            elif entry[5] == self.generation and entry[1] > depth:
+                # Depth-preferred within a search, always replace stale entries.
+                return
+        self.entries[i] = (key, depth, flag, score, move, self.generation)
+
+    def store_move(self, key, move):
+        # Records a move to try first without claiming any depth or bound for it.
+        entry = self.probe(key)
+        if entry is not None:
+            self.entries[key % self.size] = entry[:4] + (move, self.generation)
+        else:
+            self.entries[key % self.size] = (key, -1, EXACT, 0, move, self.generation)
+
+
+MATE_SCORE = 999999
+
+class SearchTimeout(Exception):
+    pass
+
+class SearchLimits:
+    def __init__(self, time_limit=None, max_nodes=None, stop_flag=None):
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.start = time.perf_counter()
+        self.deadline = self.start + time_limit if time_limit is not None else None
+        self.nodes = 0
+        self.enforced = True
+        self.stop_requested = False
+        # A multiprocessing.Value shared with other processes, polled with the clock.
+        self.stop_flag = stop_flag
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def tick(self):
+        self.nodes += 1
+        if self.stop_requested:
+            raise SearchTimeout()
+        if not self.enforced:
+            return
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if not self.nodes & 255:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop_flag is not None and self.stop_flag.value:
+                raise SearchTimeout()
+
+
+MAX_PLY = 128
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORES = (1 << 22, (1 << 22) - 1)
+# Most valuable victim first, then least valuable attacker; the king counts as the least valuable attacker.
+MVV_LVA = [[TYPE_VALUES[v] * 1000 - min(TYPE_VALUES[a], 999) for a in range(6)] for v in range(6)]
+# Indexed by the promotion bits of a move; only queen promotions jump ahead of captures.
+PROMOTION_SCORES = [0, 0, 0, 0, TYPE_VALUES[QUEEN] * 1000]
+
+class MoveOrdering:
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[0] * 64 for _ in range(12)]
+        self.root_ply = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self, board):
+        self.root_ply = board.ply
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for row in self.history:
+            for sq in range(64):
+                row[sq] >>= 1
+
+    def ply(self, board):
+        return min(board.ply - self.root_ply, MAX_PLY - 1)
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def order(self, board, moves, ply, hash_move=None):
+        squares = board.squares
+        killers = self.killers[ply]
+        history = self.history
+        scored = []
+        for m in moves:
+            moving = squares[m & 63]
+            to = (m >> 6) & 63
+            if m == hash_move:
+                score = HASH_MOVE_SCORE
+            elif m & TACTICAL_MASK:
+                score = CAPTURE_SCORE + PROMOTION_SCORES[(m >> 12) & 7]
+                if m & CAPTURE_FLAG:
+                    score += MVV_LVA[CODE_TYPE[squares[to]]][CODE_TYPE[moving]]
+            elif m == killers[0]:
+                score = KILLER_SCORES[0]
+            elif m == killers[1]:
+                score = KILLER_SCORES[1]
+            else:
+                score = history[moving][to]
+            scored.append((score, m))
+        scored.sort(key=lambda sm: sm[0], reverse=True)
+        return [m for _, m in scored]
+
+    def staged_moves(self, board, ply, hash_move=None, info=None):
+        # Lazy generation: hash move, captures and promotions, killers, then the other quiet
+        # moves by history. A cutoff stops the generator before the later stages are built.
+        if info is None:
+            info = board.check_info()
+        if hash_move is not None and board.is_legal(hash_move, info):
+            yield hash_move
+        else:
+            hash_move = None
+        for m in capture_order(board, board.generate_moves(TACTICAL_MOVES, info)):
+            if m != hash_move:
+                yield m
+        quiets = board.generate_moves(QUIET_MOVES, info)
+        killers = [k for k in self.killers[ply] if k is not None and k != hash_move and k in quiets]
+        yield from killers
+        squares = board.squares
+        history = self.history
+        rest = [m for m in quiets if m != hash_move and m not in killers]
+        rest.sort(key=lambda m: history[squares[m & 63]][(m >> 6) & 63], reverse=True)
+        yield from rest
+
+    def cutoff(self, board, move, index, ply, depth):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        if move & TACTICAL_MASK:
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[board.squares[move & 63]][(move >> 6) & 63] += depth * depth
+
+
+# Margin on top of the captured piece's value before a capture is considered hopeless.
+DELTA_MARGIN = 200
+
+def capture_order(board, moves):
+    squares = board.squares
+    def score(m):
+        s = PROMOTION_SCORES[(m >> 12) & 7]
+        if m & CAPTURE_FLAG:
+            s += MVV_LVA[CODE_TYPE[squares[(m >> 6) & 63]]][CODE_TYPE[squares[m & 63]]]
+        return s
+    return sorted(moves, key=score, reverse=True)
 
-def minimax(board, depth, alpha, beta, maximizing):
-    over = board.game_over()
-    if depth == 0 or over is not None:
-        if over == 'checkmate':
-            return (None, -999999 if maximizing else 999999)
-        if over == 'stalemate':
-            return (None, 0)
-        return (None, board.evaluate())
+def quiesce(board, alpha, beta, maximizing, limits=None):
+    if limits is not None:
+        limits.tick()
+    color = WHITE if board.white_to_move else BLACK
+    if board.king_attacked(color):
+        # No standing pat in check: every evasion is searched, none means mate.
+        moves = board.all_moves()
+        if not moves:
+            return -MATE_SCORE if maximizing else MATE_SCORE
+        stand_pat = None
+    else:
+        stand_pat = board.evaluate()
+        if maximizing:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+        moves = board.tactical_moves()
+
+    squares = board.squares
+    best = stand_pat if stand_pat is not None else (-10**9 if maximizing else 10**9)
+    for m in capture_order(board, moves):
+        if stand_pat is not None and not m & PROMO_MASK:
+            # Delta pruning: even winning the piece outright can't reach the window.
+            gain = TYPE_VALUES[CODE_TYPE[squares[(m >> 6) & 63]]] + DELTA_MARGIN
+            if (stand_pat + gain <= alpha) if maximizing else (stand_pat - gain >= beta):
+                continue
+        board.make_move(m)
+        score = quiesce(board, alpha, beta, not maximizing, limits)
+        board.undo_move()
+        if maximizing:
+            if score > best:
+                best = score
+            alpha = max(alpha, score)
+        else:
+            if score < best:
+                best = score
+            beta = min(beta, score)
+        if beta <= alpha:
+            break
+    return best
+
+
+class SearchOptions:
+    # Selectivity switches for minimax, each usable on its own so its effect can be measured.
+    def __init__(self, pvs=True, null_move=True, lmr=True, null_move_reduction=2, lmr_min_depth=3, lmr_full_moves=3):
+        self.pvs = pvs
+        self.null_move = null_move
+        self.lmr = lmr
+        self.null_move_reduction = null_move_reduction
+        self.lmr_min_depth = lmr_min_depth
+        self.lmr_full_moves = lmr_full_moves
+
+
+def minimax(board, depth, alpha, beta, maximizing, tt=None, limits=None, ordering=None, qsearch=False, options=None):
+    if limits is not None:
+        limits.tick()
+    hash_move = None
+    if tt is not None:
+        entry = tt.probe(board.hash)
+        if entry is not None:
+            hash_move = entry[4]
+            if entry[1] >= depth:
+                flag, score = entry[2], entry[3]
+                if flag == EXACT:
+                    return (hash_move, score)
+                if flag == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if beta <= alpha:
+                    return (hash_move, score)
 
+    if depth == 0 and qsearch:
+        return (None, quiesce(board, alpha, beta, maximizing, limits))
+
+    # Moves are generated once per node; having none is what tells mate or stalemate.
+    info = board.check_info()
+    in_check = info[0] != 0
+    mated = (None, (-MATE_SCORE if maximizing else MATE_SCORE) if in_check else 0)
+    if depth == 0:
+        return (None, board.evaluate()) if board.generate_moves(ALL_MOVES, info) else mated
+
+    def search(d, a, b):
+        return minimax(board, d, a, b, not maximizing, tt, limits, ordering, qsearch, options)[1]
+
+    ply = ordering.ply(board) if ordering is not None else None
+    color = WHITE if maximizing else BLACK
+    if (options is not None and options.null_move and ply != 0 and not in_check
+            and depth > options.null_move_reduction and not board.last_move_was_null()
+            and board.has_non_pawn_material(color)):
+        # Null move: if passing still fails high, a real move will too. Skipped in check and
+        # with only pawns left, where zugzwang makes passing the better option.
+        board.make_null_move()
+        d = depth - 1 - options.null_move_reduction
+        eval = search(d, beta - 1, beta) if maximizing else search(d, alpha, alpha + 1)
+        board.undo_move()
+        if maximizing and eval >= beta:
+            return (None, beta)
+        if not maximizing and eval <= alpha:
+            return (None, alpha)
+
+    if ordering is not None:
+        moves = ordering.staged_moves(board, ply, hash_move, info)
+    else:
+        moves = board.generate_moves(ALL_MOVES, info)
+        if hash_move is not None and hash_move in moves:
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+    alpha0, beta0 = alpha, beta
     best_move = None
-    if maximizing:
-        max_eval = -10**9
-        for m in board.all_moves():
-            board.make_move(m)
-            _, eval = minimax(board, depth-1, alpha, beta, False)
-            board.undo_move()
-            if eval > max_eval:
-                max_eval = eval; best_move = m
+    best_eval = -10**9 if maximizing else 10**9
+    for i, m in enumerate(moves):
+        quiet = not m & TACTICAL_MASK
+        board.make_move(m)
+        if i == 0 or options is None:
+            eval = search(depth-1, alpha, beta)
+        else:
+            # Later moves are expected to fail low: scout them with a null window (PVS)
+            # and, for late quiet moves, one ply shallower (LMR); re-search on surprise.
+            if options.pvs:
+                a, b = (alpha, alpha + 1) if maximizing else (beta - 1, beta)
+            else:
+                a, b = alpha, beta
+            reduction = 0
+            if (options.lmr and quiet and not in_check and depth >= options.lmr_min_depth
+                    and i >= options.lmr_full_moves and not board.king_attacked(color ^ 1)):
+                reduction = 1
+            eval = search(depth-1-reduction, a, b)
+            if reduction and (eval > alpha if maximizing else eval < beta):
+                eval = search(depth-1, a, b)
+            if options.pvs and alpha < eval < beta:
+                eval = search(depth-1, alpha, beta)
+        board.undo_move()
+        if maximizing:
+            if eval > best_eval:
+                best_eval = eval; best_move = m
             alpha = max(alpha, eval)
-            if beta <= alpha:
-                break
-        return (best_move, max_eval)
-    else:
-        min_eval = 10**9
-        for m in board.all_moves():
-            board.make_move(m)
-            _, eval = minimax(board, depth-1, alpha, beta, True)
-            board.undo_move()
-            if eval < min_eval:
-                min_eval = eval; best_move = m
+        else:
+            if eval < best_eval:
+                best_eval = eval; best_move = m
             beta = min(beta, eval)
-            if beta <= alpha:
+        if beta <= alpha:
+            if ordering is not None:
+                ordering.cutoff(board, m, i, ply, depth)
+            break
+
+    if best_move is None:
+        return mated
+    if tt is not None:
+        if best_eval <= alpha0:
+            flag = UPPER_BOUND
+        elif best_eval >= beta0:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        tt.store(board.hash, depth, flag, best_eval, best_move)
+    return (best_move, best_eval)
+
+
+def principal_variation(board, tt, max_length):
+    pv = []
+    while len(pv) < max_length:
+        entry = tt.probe(board.hash)
+        if entry is None or entry[4] is None or not board.is_legal(entry[4]):
+            break
+        pv.append(entry[4])
+        board.make_move(entry[4])
+    for _ in pv:
+        board.undo_move()
+    return pv
+
+
+class SearchStats:
+    # Opt-in search instrumentation: pass one to iterative_deepening(). While attached it
+    # wraps the board's and the table's methods with counting timers; searches without
+    # stats run the plain methods, so disabled stats cost nothing.
+    SECTIONS = {'check_info': 'check', 'king_attacked': 'check', 'generate_moves': 'movegen',
+                'is_legal': 'movegen', 'evaluate': 'eval'}
+
+    def __init__(self):
+        self.nodes = 0
+        self.evaluations = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.time = 0.0
+        self.section_times = {'movegen': 0.0, 'eval': 0.0, 'check': 0.0}
+        self.depths = []
+        self.inside = False
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def nps(self):
+        return self.nodes / self.time if self.time else 0.0
+
+    def timed(self, fn, section):
+        # Only the outermost timed call counts, so generation calling check_info isn't counted twice.
+        times = self.section_times
+        def wrapper(*args):
+            if self.inside:
+                return fn(*args)
+            self.inside = True
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                times[section] += time.perf_counter() - start
+                self.inside = False
+        return wrapper
+
+    def attach(self, board, tt):
+        for name, section in self.SECTIONS.items():
+            setattr(board, name, self.timed(getattr(board, name), section))
+        evaluate = board.evaluate
+        def counted_evaluate():
+            self.evaluations += 1
+            return evaluate()
+        board.evaluate = counted_evaluate
+        probe = tt.probe
+        def counted_probe(key):
+            entry = probe(key)
+            self.tt_probes += 1
+            if entry is not None:
+                self.tt_hits += 1
+            return entry
+        tt.probe = counted_probe
+
+    def detach(self, board, tt):
+        for name in self.SECTIONS:
+            del board.__dict__[name]
+        del tt.__dict__['probe']
+        self.inside = False
+
+    def add_depth(self, depth, seconds, nodes, move, score):
+        self.depths.append({'depth': depth, 'time': round(seconds, 6), 'nodes': nodes,
+                            'move': move_name(move) if move is not None else None, 'score': score})
+
+    def to_dict(self):
+        return {'nodes': self.nodes, 'time': round(self.time, 6), 'nps': round(self.nps()),
+                'evaluations': self.evaluations, 'cutoffs': self.cutoffs,
+                'first_move_cutoff_rate': round(self.first_move_cutoff_rate(), 4),
+                'tt_probes': self.tt_probes, 'tt_hits': self.tt_hits,
+                'section_times': {k: round(v, 6) for k, v in self.section_times.items()},
+                'depths': self.depths}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def summary(self):
+        times = self.section_times
+        return (f"{self.nodes} nodes {self.nps():.0f} nps, {self.evaluations} evals, "
+                f"{self.cutoffs} cutoffs ({self.first_move_cutoff_rate():.0%} first move), "
+                f"tt {self.tt_hits}/{self.tt_probes}, movegen {times['movegen']:.2f}s "
+                f"eval {times['eval']:.2f}s check {times['check']:.2f}s")
+
+
+def iterative_deepening(board, time_limit=None, max_depth=64, max_nodes=None, tt=None, ordering=None, qsearch=True,
+                        limits=None, on_iteration=None, options=None, stats=None):
+    # Returns (best_move, eval, depth) from the deepest iteration that finished in time.
+    # Pass limits to stop the search or move its deadline from another thread;
+    # on_iteration(depth, move, eval, pv) is called after every completed depth.
+    if tt is None:
+        tt = TranspositionTable(16)
+    tt.new_search()
+    if ordering is None:
+        ordering = MoveOrdering()
+    ordering.new_search(board)
+    if limits is None:
+        limits = SearchLimits(time_limit, max_nodes)
+    if stats is not None:
+        stats.attach(board, tt)
+        cutoffs, first_move_cutoffs = ordering.cutoffs, ordering.first_move_cutoffs
+    root_ply = board.ply
+    best_move, best_eval, completed = None, None, 0
+    pv = []
+    # Searches that raise (interrupts, worker errors) must not leave the stats wrappers attached.
+    try:
+        for depth in range(1, max_depth + 1):
+            # The first iteration always completes so there is a move to play.
+            limits.enforced = depth > 1
+            iteration_start = time.perf_counter()
+            iteration_nodes = limits.nodes
+            for m in pv:
+                tt.store_move(board.hash, m)
+                board.make_move(m)
+            for _ in pv:
+                board.undo_move()
+            try:
+                move, val = minimax(board, depth, -10**9, 10**9, board.white_to_move, tt, limits, ordering, qsearch, options)
+            except SearchTimeout:
+                while board.ply > root_ply:
+                    board.undo_move()
                 break
-        return (best_move, min_eval)
+            best_move, best_eval, completed = move, val, depth
+            if stats is not None:
+                stats.add_depth(depth, time.perf_counter() - iteration_start, limits.nodes - iteration_nodes, move, val)
+            pv = principal_variation(board, tt, depth)
+            if on_iteration is not None:
+                on_iteration(depth, move, val, pv)
+            if move is None or abs(val) >= MATE_SCORE:
+                break
+            # The next iteration costs several times this one; don't start what can't finish.
+            now = time.perf_counter()
+            if limits.deadline is not None and now + (now - iteration_start) * 3 > limits.deadline:
+                break
+    finally:
+        if stats is not None:
+            stats.detach(board, tt)
+    if stats is not None:
+        stats.nodes = limits.nodes
+        stats.time = limits.elapsed()
+        stats.cutoffs = ordering.cutoffs - cutoffs
+        stats.first_move_cutoffs = ordering.first_move_cutoffs - first_move_cutoffs
+    return best_move, best_eval, completed
+
+
+# Per-process state of the ParallelSearch pool workers.
+_worker = {}
+
+def _init_worker(best, stop_flag, tt_size_mb, options):
+    _worker['best'] = best
+    _worker['options'] = options
+    _worker['stop'] = stop_flag
+    _worker['tt'] = TranspositionTable(tt_size_mb) if tt_size_mb else None
+    _worker['ordering'] = MoveOrdering()
+    _worker['search_id'] = None
+
+def _search_root_move(board, move, depth, alpha, beta, qsearch, search_id, shared):
+    # Searches one root move. With shared, the window is first tightened by the best
+    # score any worker has proven so far (kept from the side to move's point of view).
+    tt, ordering = _worker['tt'], _worker['ordering']
+    if _worker['search_id'] != search_id:
+        _worker['search_id'] = search_id
+        if tt is not None:
+            tt.new_search()
+        ordering.new_search(board)
+    maximizing = board.white_to_move
+    best = _worker['best']
+    if shared:
+        if maximizing:
+            alpha = max(alpha, best.value)
+        else:
+            beta = min(beta, -best.value)
+    if _worker['stop'].value:
+        return None
+    limits = SearchLimits(stop_flag=_worker['stop'])
+    board.make_move(move)
+    try:
+        _, score = minimax(board, depth - 1, alpha, beta, not maximizing, tt, limits, ordering, qsearch,
+                           _worker['options'])
+    except SearchTimeout:
+        return None
+    pv = [move] + principal_variation(board, tt, depth - 1) if tt is not None else [move]
+    if shared and alpha < score < beta:
+        with best.get_lock():
+            best.value = max(best.value, score if maximizing else -score)
+    return score, alpha, beta, limits.nodes, pv
+
+
+class ParallelSearch:
+    # Root splitting over a process pool. The first root move is searched alone, then the
+    # rest run in parallel against a shared best score. The result matches a serial minimax
+    # over the same root move order when the workers run without transposition tables
+    # (tt_size_mb=0); with tables, scores can differ the way deeper table hits always can.
+    def __init__(self, workers, tt_size_mb=64, qsearch=True, options=None):
+        ctx = multiprocessing.get_context()
+        self.best = ctx.Value('q', 0)
+        self.stop_flag = ctx.Value('b', 0)
+        self.qsearch = qsearch
+        self.search_id = 0
+        self.pool = ctx.Pool(workers, _init_worker, (self.best, self.stop_flag, tt_size_mb, options))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def wait(self, pending, limits):
+        while not all(r.ready() for r in pending):
+            if limits.stop_requested or (limits.enforced and limits.deadline is not None
+                                         and time.perf_counter() >= limits.deadline):
+                self.stop_flag.value = 1
+                for r in pending:
+                    r.wait()
+                self.stop_flag.value = 0
+                return False
+            time.sleep(0.002)
+        return True
+
+    def search(self, board, depth, limits=None, root_moves=None):
+        # Returns (best_move, eval, pv), or None if the limits stopped it first.
+        if limits is None:
+            limits = SearchLimits()
+        if root_moves is None:
+            root_moves = board.all_moves()
+        if not root_moves or depth < 1:
+            move, score = minimax(board, depth, -10**9, 10**9, board.white_to_move)
+            return move, score, []
+        maximizing = board.white_to_move
+        self.search_id += 1
+        self.best.value = -10**9
+        args = (depth, -10**9, 10**9, self.qsearch, self.search_id, True)
+        pending = [self.pool.apply_async(_search_root_move, (board, root_moves[0]) + args)]
+        if not self.wait(pending, limits):
+            return None
+        pending += [self.pool.apply_async(_search_root_move, (board, m) + args) for m in root_moves[1:]]
+        if not self.wait(pending, limits):
+            return None
+        results = [r.get() for r in pending]
+        if any(r is None for r in results):
+            return None
+        limits.nodes += sum(r[3] for r in results)
+
+        def own_view(score):
+            return score if maximizing else -score
+        best = max(own_view(r[0]) for r in results if r[1] < r[0] < r[2])
+        for i, (score, alpha, beta, _, pv) in enumerate(results):
+            if own_view(score) < best:
+                continue
+            if not alpha < score < beta:
+                # A fail-low that only ties the best: confirm the true score reaches it,
+                # as the serial search would have seen it first.
+                window = (best - 1, best) if maximizing else (-best, -best + 1)
+                check = self.pool.apply_async(_search_root_move, (board, root_moves[i], depth) + window +
+                                              (self.qsearch, self.search_id, False))
+                if not self.wait([check], limits) or check.get() is None:
+                    return None
+                if own_view(check.get()[0]) < best:
+                    continue
+                pv = check.get()[4]
+            return root_moves[i], (best if maximizing else -best), pv
+
+    def iterative_deepening(self, board, time_limit=None, max_depth=64, limits=None, on_iteration=None, stats=None):
+        # Same contract as the serial iterative_deepening(); the previous best move is searched first.
+        # Stats only get nodes and per-depth timing, the rest happens in the workers.
+        if limits is None:
+            limits = SearchLimits(time_limit)
+        ordering = MoveOrdering()
+        best_move, best_eval, completed = None, None, 0
+        for depth in range(1, max_depth + 1):
+            limits.enforced = depth > 1
+            iteration_start = time.perf_counter()
+            iteration_nodes = limits.nodes
+            root_moves = ordering.order(board, board.all_moves(), 0, best_move)
+            result = self.search(board, depth, limits, root_moves)
+            if result is None:
+                break
+            move, val, pv = result
+            best_move, best_eval, completed = move, val, depth
+            if stats is not None:
+                stats.add_depth(depth, time.perf_counter() - iteration_start, limits.nodes - iteration_nodes, move, val)
+            if on_iteration is not None:
+                on_iteration(depth, move, val, pv)
+            if move is None or abs(val) >= MATE_SCORE:
+                break
+            now = time.perf_counter()
+            if limits.deadline is not None and now + (now - iteration_start) * 3 > limits.deadline:
+                break
+        if stats is not None:
+            stats.nodes = limits.nodes
+            stats.time = limits.elapsed()
+        return best_move, best_eval, completed
+
+
+def move_name(move):
+    (sr, sc), (tr, tc), promo = move_to_tuple(move)
+    return f"{'abcdefgh'[sc]}{8 - sr}{'abcdefgh'[tc]}{8 - tr}{promo or ''}"
+
+def parse_move(board, name):
+    # The legal move written as move_name() writes it, or None.
+    for m in board.all_moves():
+        if move_name(m) == name:
+            return m
+    return None
+
+def square_name(sq):
+    r, c = SQUARE_RC[sq]
+    return f"{'abcdefgh'[c]}{8 - r}"
+
+# Piece, origin file and rank when given, target, promotion; check and annotation marks are dropped.
+SAN_RE = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])=?([NBRQnbrq])?$')
+
+def parse_san(board, name):
+    # The legal move written in SAN (e4, Nbd7, exd5, e8=Q+), or None when it is illegal or
+    # ambiguous. Castling never parses: the Board has no castling.
+    match = SAN_RE.match(name.rstrip('+#!?'))
+    if not match:
+        return None
+    piece, file, rank, target, promo = match.groups()
+    ptype = PIECE_CHARS.index(piece.lower()) if piece else PAWN
+    promo = PIECE_CHARS.index(promo.lower()) if promo else 0
+    found = []
+    for m in board.all_moves():
+        frm = m & 63
+        origin = square_name(frm)
+        if (square_name((m >> 6) & 63) == target and CODE_TYPE[board.squares[frm]] == ptype
+                and (m >> 12) & 7 == promo and file in (None, origin[0]) and rank in (None, origin[1])):
+            found.append(m)
+    return found[0] if len(found) == 1 else None
+
+def parse_any_move(board, name):
+    # A move in move_name() coordinates or in SAN, as game records may hold either.
+    move = parse_move(board, name)
+    return move if move is not None else parse_san(board, name)
+
+
+# Book entries: position hash, move, weight; sorted by hash then move (built by book.py).
+BOOK_ENTRY = struct.Struct('<QHH')
+
+class OpeningBook:
+    # The file is memory-mapped and binary-searched, so only the pages a lookup touches are read.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // BOOK_ENTRY.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b''
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+    def entry(self, i):
+        return BOOK_ENTRY.unpack_from(self.data, i * BOOK_ENTRY.size)
+
+    def moves(self, board):
+        # [(move, weight)] for the position, skipping anything illegal (a hash collision).
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.entry(mid)[0] < board.hash:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        info = None
+        while lo < self.count:
+            key, move, weight = self.entry(lo)
+            if key != board.hash:
+                break
+            if info is None:
+                info = board.check_info()
+            if board.is_legal(move, info):
+                found.append((move, weight))
+            lo += 1
+        return found
+
+    def choose(self, board, rng=random):
+        # A book move picked in proportion to its weight, or None when out of book.
+        found = self.moves(board)
+        if not found:
+            return None
+        return rng.choices([m for m, _ in found], weights=[w for _, w in found])[0]
+
+
+class BackgroundSearch:
+    # Runs iterative_deepening on a copy of the board in a worker thread so the GUI keeps
+    # repainting. With time_limit=None it ponders until stop() or ponderhit().
+    def __init__(self, board, time_limit, max_depth, max_nodes, tt, ordering, parallel=None, options=None, stats=None):
+        self.board = board.clone()
+        self.parallel = parallel
+        self.options = options
+        self.stats = stats
+        self.hash = board.hash
+        self.max_depth = max_depth
+        self.tt = tt
+        self.ordering = ordering
+        self.limits = SearchLimits(time_limit, max_nodes)
+        self.depth = 0
+        self.move = None
+        self.score = None
+        self.pv = []
+        self.result = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        if self.parallel is not None:
+            self.result = self.parallel.iterative_deepening(self.board, None, self.max_depth, limits=self.limits,
+                                                            on_iteration=self.progress, stats=self.stats)
+            return
+        self.result = iterative_deepening(self.board, None, self.max_depth, None, self.tt, self.ordering,
+                                          limits=self.limits, on_iteration=self.progress, options=self.options,
+                                          stats=self.stats)
+
+    def progress(self, depth, move, score, pv):
+        self.depth, self.move, self.score, self.pv = depth, move, score, pv
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def ponderhit(self, time_limit):
+        # The predicted move was played: keep the work done so far and start the clock now.
+        self.limits.deadline = time.perf_counter() + time_limit
+
+    def stop(self):
+        self.limits.stop_requested = True
+        self.thread.join()
 
 
 SQUARE = 64
 WIDTH, HEIGHT = 8*SQUARE, 8*SQUARE
+# The piece images live in the repository's assets/, next to this directory.
+ASSETS_DIR = os.path.join(os.path.dirname(MODULE_DIR), 'assets')
 
 def load_piece_images():
+    # Missing images fall back to a disc with the piece letter, rendered here once.
     images = {}
     names = ['p','r','n','b','q','k']
+    font = pygame.font.SysFont(None, 28)
     for color in ('w','b'):
         for n in names:
             key = color + n
-            filename = f'assets/{key}.png'
+            filename = os.path.join(ASSETS_DIR, f'{key}.png')
             try:
                 img = pygame.image.load(filename)
                 img = pygame.transform.smoothscale(img, (SQUARE, SQUARE))
                 images[key] = img
             except Exception as e:
-                images[key] = None
+                img = pygame.Surface((SQUARE, SQUARE), pygame.SRCALPHA)
+                pygame.draw.circle(img, (0,0,0), (SQUARE//2, SQUARE//2), SQUARE//2 - 6)
+                img.blit(font.render(n.upper(), True, (255,255,255)), (6, 10))
+                images[key] = img
     return images
 
-def draw_board(screen, board_obj, images, selected, legal_moves):
+def render_background():
+    background = pygame.Surface((WIDTH, HEIGHT))
     colors = [(240,217,181),(181,136,99)]
     for r in range(8):
         for c in range(8):
-            color = colors[(r+c) % 2]
-            pygame.draw.rect(screen, color, (c*SQUARE, r*SQUARE, SQUARE, SQUARE))
-    if selected:
-        sr, sc = selected
-        pygame.draw.rect(screen, (255,255,0,80), (sc*SQUARE, sr*SQUARE, SQUARE, SQUARE), 4)
-    for m in legal_moves:
-        (_, _), (tr, tc), _ = m
-        center = (tc*SQUARE + SQUARE//2, tr*SQUARE + SQUARE//2)
-        pygame.draw.circle(screen, (0,0,0), center, 8)
-    for r in range(8):
-        for c in range(8):
-            p = board_obj.board[r][c]
-            if p != '':
-                key = p
-                img = images.get(key)
-                if img:
-                    screen.blit(img, (c*SQUARE, r*SQUARE))
-                else:
-                    pygame.draw.circle(screen, (0,0,0), (c*SQUARE + SQUARE//2, r*SQUARE + SQUARE//2), SQUARE//2 - 6)
-                    font = pygame.font.SysFont(None, 28)
-                    txt = font.render(p[1].upper(), True, (255,255,255))
-                    screen.blit(txt, (c*SQUARE+6, r*SQUARE+10))
+            pygame.draw.rect(background, colors[(r+c) % 2], (c*SQUARE, r*SQUARE, SQUARE, SQUARE))
+    return background
+
+
+class PositionCache:
+    # Legal moves (as GUI tuples) and game-over status of the last position asked for,
+    # so the loop only generates moves when the position actually changes.
+    def __init__(self):
+        self.hash = None
+        self.moves = []
+        self.over = None
+
+    def get(self, board):
+        if board.hash != self.hash:
+            moves, self.over = board.moves_and_status()
+            self.moves = [move_to_tuple(m) for m in moves]
+            self.hash = board.hash
+        return self.moves, self.over
+
+
+class BoardRenderer:
+    # Redraws only the squares whose piece, selection or move marker changed, plus the text
+    # overlays (status line, game-over banner), and pushes just those rectangles to the display.
+    def __init__(self, screen, images):
+        self.screen = screen
+        self.images = images
+        self.background = render_background()
+        self.status_font = pygame.font.SysFont(None, 20)
+        self.banner_font = pygame.font.SysFont(None, 48)
+        self.drawn = [None] * 64
+        # name -> (text, surface, position) as last drawn.
+        self.overlays = {}
+
+    def overlay(self, text, font, color, pos):
+        if not text:
+            return None
+        return (text, font.render(text, True, color), pos)
+
+    def squares_under(self, surf, pos):
+        x, y = pos
+        w, h = surf.get_size()
+        return {r*8 + c for r in range(max(0, y // SQUARE), min(8, (y + h - 1) // SQUARE + 1))
+                for c in range(max(0, x // SQUARE), min(8, (x + w - 1) // SQUARE + 1))}
+
+    def draw(self, board_obj, selected, legal_moves, status, banner):
+        targets = {tr*8 + tc for (_, _), (tr, tc), _ in legal_moves}
+        sel = selected[0]*8 + selected[1] if selected else None
+        state = [(board_obj.squares[sq], sq == sel, sq in targets) for sq in range(64)]
+        dirty = {sq for sq in range(64) if state[sq] != self.drawn[sq]}
+
+        overlays = {'status': self.overlay(status, self.status_font, (255,255,255), (4, HEIGHT-22)),
+                    'banner': self.overlay(banner, self.banner_font, (255,0,0), (10, 10))}
+        for name, new in overlays.items():
+            old = self.overlays.get(name)
+            if (old and old[0]) != (new and new[0]):
+                for o in (old, new):
+                    if o:
+                        dirty |= self.squares_under(o[1], o[2])
+        # Antialiased text can't be drawn twice over itself: any touched overlay gets its squares redrawn.
+        for new in overlays.values():
+            if new:
+                under = self.squares_under(new[1], new[2])
+                if under & dirty:
+                    dirty |= under
+        if not dirty:
+            return
+
+        rects = []
+        for sq in dirty:
+            r, c = SQUARE_RC[sq]
+            rect = pygame.Rect(c*SQUARE, r*SQUARE, SQUARE, SQUARE)
+            code, is_selected, is_target = state[sq]
+            self.screen.blit(self.background, rect, rect)
+            if is_selected:
+                pygame.draw.rect(self.screen, (255,255,0,80), rect, 4)
+            if is_target:
+                pygame.draw.circle(self.screen, (0,0,0), rect.center, 8)
+            if code is not None:
+                self.screen.blit(self.images[PIECE_NAMES[code]], rect)
+            self.drawn[sq] = state[sq]
+            rects.append(rect)
+        for new in overlays.values():
+            if new and self.squares_under(new[1], new[2]) & dirty:
+                self.screen.blit(new[1], new[2])
+        self.overlays = overlays
+        pygame.display.update(rects)
 
 def coords_from_mouse(pos):
     x,y = pos
@@ -301,84 +1629,160 @@ def coords_from_mouse(pos):
     return (r,c)
 
 def main():
+    from gamerecord import PGNWriter, new_game
+
+    ai_workers = 1
+    ai_options = SearchOptions()
+    # Start the pool before pygame and the search threads so the workers fork from a clean process.
+    parallel = ParallelSearch(ai_workers, options=ai_options) if ai_workers > 1 else None
+
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption('Chess - AI from scratch')
     clock = pygame.time.Clock()
     images = load_piece_images()
+    renderer = BoardRenderer(screen, images)
+    cache = PositionCache()
 
     board = Board()
     selected = None
     legal = []
-    ai_depth = 5
+    ai_depth = 64
+    ai_time_limit = 3.0
+    ai_max_nodes = None
+    tt_size_mb = 64
+    tt = TranspositionTable(tt_size_mb)
+    ordering = MoveOrdering()
+    ai_ponder = True
+    ai_book = os.path.join(MODULE_DIR, 'book.bin')
+    # Search statistics after every AI move; ai_stats_file also appends them there as JSON lines.
+    ai_stats = False
+    ai_stats_file = None
+    book = OpeningBook(ai_book) if ai_book and os.path.exists(ai_book) else None
     human_plays_white = True
+    # Every game is appended to this PGN file when it ends or the window is closed.
+    game_record_path = os.path.join(MODULE_DIR, 'games.pgn')
+    record = new_game(white='Human' if human_plays_white else 'IAminimax',
+                      black='IAminimax' if human_plays_white else 'Human', event='IA_chess')
+    record_saved = False
+
+    def play(move):
+        record.moves.append(board.san(move))
+        board.make_move(move)
+
+    def save_record(result):
+        if game_record_path and record.moves:
+            with PGNWriter(game_record_path) as writer:
+                record.result = result
+                writer.write(record)
 
     running = True
-    thinking = False
-    ai_move_start_time = 0
+    search = None
+    ponder = None
+    ponder_move = None
 
     while running:
         clock.tick(30)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN and not thinking:
+            elif event.type == pygame.MOUSEBUTTONDOWN and search is None:
                 pos = pygame.mouse.get_pos()
                 r,c = coords_from_mouse(pos)
                 if selected is None:
                     piece = board.piece_at(r,c)
                     if piece != '' and ((piece[0]=='w') == board.white_to_move):
                         selected = (r,c)
-                        all_moves = board.all_moves()
-                        legal = [m for m in all_moves if m[0] == (r,c)]
+                        legal = [m for m in cache.get(board)[0] if m[0] == (r,c)]
                 else:
                     candidate = None
                     for m in legal:
                         if m[1] == (r,c):
                             candidate = m; break
                     if candidate:
-                        board.make_move(candidate)
+                        play(board.move_from_tuple(candidate))
                         selected = None; legal = []
                     else:
                         piece = board.piece_at(r,c)
                         if piece != '' and ((piece[0]=='w') == board.white_to_move):
                             selected = (r,c)
-                            all_moves = board.all_moves()
-                            legal = [m for m in all_moves if m[0] == (r,c)]
+                            legal = [m for m in cache.get(board)[0] if m[0] == (r,c)]
                         else:
                             selected = None; legal = []
 
-        if (board.white_to_move and not human_plays_white) or (not board.white_to_move and human_plays_white):
-            if not thinking:
-                thinking = True
-                ai_move_start_time = time.time()
-                best_move, val = minimax(board, ai_depth, -10**9, 10**9, board.white_to_move)
-                if best_move is not None:
-                    board.make_move(best_move)
-                thinking = False
-                print(f"AI played in {time.time() - ai_move_start_time:.2f}s, eval={val}")
+        over = cache.get(board)[1]
+        if over is None and (board.white_to_move != human_plays_white) and search is None:
+            book_move = book.choose(board) if book is not None else None
+            if book_move is not None:
+                if ponder is not None:
+                    ponder.stop()
+                play(book_move)
+                print(f"AI played {move_name(book_move)} from the book")
+                over = cache.get(board)[1]
+            elif ponder is not None and ponder.hash == board.hash:
+                search = ponder
+                search.ponderhit(ai_time_limit)
+                print("Ponder hit")
+            else:
+                if ponder is not None:
+                    ponder.stop()
+                search = BackgroundSearch(board, ai_time_limit, ai_depth, ai_max_nodes, tt, ordering, parallel, ai_options,
+                                          SearchStats() if ai_stats else None)
+            ponder = None
+            ai_move_start_time = time.time()
 
-        screen.fill((0,0,0))
-        draw_board(screen, board, images, selected, legal)
+        if search is not None and search.done():
+            best_move, val, depth = search.result
+            pv = search.pv
+            search_stats = search.stats
+            search = None
+            if best_move is not None:
+                play(best_move)
+            print(f"AI played in {time.time() - ai_move_start_time:.2f}s, depth={depth}, eval={val}")
+            if search_stats is not None:
+                print(f"  {search_stats.summary()}")
+                if ai_stats_file:
+                    with open(ai_stats_file, 'a') as f:
+                        f.write(search_stats.to_json() + '\n')
+            over = cache.get(board)[1]
+            if ai_ponder and over is None and len(pv) > 1 and pv[0] == best_move:
+                # Think about our reply to the expected move while the human is thinking.
+                ponder_move = pv[1]
+                expected = board.clone()
+                expected.make_move(ponder_move)
+                ponder = BackgroundSearch(expected, None, ai_depth, None, tt, ordering, parallel, ai_options,
+                                          SearchStats() if ai_stats else None)
 
-        font = pygame.font.SysFont(None, 20)
         turn_text = 'White' if board.white_to_move else 'Black'
-        txt = font.render(f'Turn: {turn_text}  (AI depth {ai_depth})', True, (255,255,255))
-        screen.blit(txt, (4, HEIGHT-22))
+        status = f'Turn: {turn_text}  (AI {ai_time_limit:g}s/move)'
+        if search is not None:
+            best = move_name(search.move) if search.move else '-'
+            status += f'  thinking: depth {search.depth}, {search.limits.nodes} nodes, best {best}'
+        elif ponder is not None:
+            status += f'  pondering on {move_name(ponder_move)}: depth {ponder.depth}'
 
-        over = board.game_over()
+        msg = None
         if over:
-            big = pygame.font.SysFont(None, 48)
             if over == 'checkmate':
                 winner = 'Black' if board.white_to_move else 'White'
                 msg = f'Checkmate — {winner} wins'
             else:
                 msg = 'Stalemate'
-            surf = big.render(msg, True, (255,0,0))
-            screen.blit(surf, (10, 10))
+        renderer.draw(board, selected, legal, status, msg)
 
-        pygame.display.flip()
+        if over and not record_saved:
+            save_record('1/2-1/2' if over == 'stalemate' else '0-1' if board.white_to_move else '1-0')
+            record_saved = True
 
+    for worker in (search, ponder):
+        if worker is not None:
+            worker.stop()
+    if parallel is not None:
+        parallel.close()
+    if book is not None:
+        book.close()
+    if not record_saved:
+        save_record('*')
     pygame.quit()
     sys.exit()
 
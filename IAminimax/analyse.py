@@ -0,0 +1,120 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# pygame's import banner goes to stdout, where it would corrupt the JSON lines.
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+from IA_chess import Board, SearchLimits, SearchStats, TranspositionTable, iterative_deepening, move_name
+
+
+def parse_epd(line):
+    # Returns (fen, operations) for a FEN or EPD line. EPD has four position fields
+    # followed by 'opcode operand;' operations; a FEN may end with its two move counters.
+    fields = line.split(None, 4)
+    ops = {}
+    if len(fields) == 5 and not fields[4].replace(' ', '').isdigit():
+        for op in fields[4].split(';'):
+            op = op.strip()
+            if op:
+                name, _, value = op.partition(' ')
+                ops[name] = value.strip().strip('"')
+        return ' '.join(fields[:4]), ops
+    return line.strip(), ops
+
+
+def read_positions(lines):
+    # Streams (line number, fen, operations) from FEN or EPD lines, skipping blanks and '#' comments.
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            fen, ops = parse_epd(line)
+            yield n, fen, ops
+
+
+def analyse(job):
+    n, fen, ops, depth, time_limit, tt_size_mb, with_stats = job
+    record = {'line': n, 'fen': fen}
+    if 'id' in ops:
+        record['id'] = ops['id']
+    board = Board()
+    try:
+        board.set_fen(fen)
+    except ValueError as e:
+        record['error'] = str(e)
+        return record
+    limits = SearchLimits(time_limit)
+    stats = SearchStats() if with_stats else None
+    pv = []
+    def on_iteration(d, move, score, line):
+        pv[:] = line
+    move, score, completed = iterative_deepening(board, max_depth=depth, tt=TranspositionTable(tt_size_mb),
+                                                 limits=limits, on_iteration=on_iteration, stats=stats)
+    record.update({'move': move_name(move) if move is not None else None, 'score': score, 'depth': completed,
+                   'nodes': limits.nodes, 'time': round(limits.elapsed(), 3), 'pv': [move_name(m) for m in pv]})
+    if stats is not None:
+        record['stats'] = stats.to_dict()
+    return record
+
+
+def run(positions, out, depth, time_limit, workers, tt_size_mb, with_stats=False):
+    jobs = ((n, fen, ops, depth, time_limit, tt_size_mb, with_stats) for n, fen, ops in positions)
+    count = 0
+    if workers <= 1:
+        for job in jobs:
+            out.write(json.dumps(analyse(job)) + '\n')
+            out.flush()
+            count += 1
+        return count
+    # A bounded window of pending positions keeps memory flat on large inputs;
+    # results are written in input order.
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for job in jobs:
+            pending.append(pool.apply_async(analyse, (job,)))
+            if len(pending) >= workers * 2:
+                out.write(json.dumps(pending.popleft().get()) + '\n')
+                out.flush()
+                count += 1
+        while pending:
+            out.write(json.dumps(pending.popleft().get()) + '\n')
+            out.flush()
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse FEN/EPD positions with the IAminimax engine, '
+                                                 'one JSON line per position.')
+    parser.add_argument('inputs', nargs='*', default=['-'], help="position files, '-' for stdin")
+    parser.add_argument('--depth', type=int, help='maximum depth (default 5, or 64 with --time)')
+    parser.add_argument('--time', type=float, help='seconds per position')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tt-mb', type=float, default=16, help='transposition table size per worker')
+    parser.add_argument('--stats', action='store_true', help='add search statistics to every record')
+    parser.add_argument('-o', '--output', help='write JSON lines here instead of stdout')
+    args = parser.parse_args(argv)
+    depth = args.depth if args.depth is not None else (64 if args.time is not None else 5)
+
+    def lines():
+        for path in args.inputs:
+            if path == '-':
+                yield from sys.stdin
+            else:
+                with open(path) as f:
+                    yield from f
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    start = time.perf_counter()
+    count = run(read_positions(lines()), out, depth, args.time, args.workers, args.tt_mb, args.stats)
+    if args.output:
+        out.close()
+    print(f"{count} positions in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+from IA_chess import Board, START_FEN, MoveOrdering, SearchLimits, SearchOptions, TranspositionTable, minimax, move_name
+from perft import perft
+
+BENCH_POSITIONS = [
+    ('startpos', START_FEN),
+    ('italian', "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w"),
+    ('kiwipete', "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w"),
+    ('middlegame', "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w"),
+    ('endgame', "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w"),
+    ('rook_ending', "8/5pk1/6p1/8/3R4/6P1/5PK1/r7 b"),
+]
+
+
+def bench_perft(fen, depth):
+    board = Board()
+    board.set_fen(fen)
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+    return {'depth': depth, 'nodes': nodes, 'seconds': round(elapsed, 4),
+            'nps': round(nodes / elapsed) if elapsed else 0}
+
+
+def bench_search(fen, depth, tt_size_mb=16, options=None):
+    # Fixed-depth search from a cold table, so runs are comparable between versions.
+    board = Board()
+    board.set_fen(fen)
+    tt = TranspositionTable(tt_size_mb)
+    ordering = MoveOrdering()
+    ordering.new_search(board)
+    limits = SearchLimits()
+    start = time.perf_counter()
+    move, score = minimax(board, depth, -10**9, 10**9, board.white_to_move, tt, limits, ordering, True, options)
+    elapsed = time.perf_counter() - start
+    return {'depth': depth, 'nodes': limits.nodes, 'seconds': round(elapsed, 4),
+            'nps': round(limits.nodes / elapsed) if elapsed else 0,
+            'move': move_name(move) if move else None, 'score': score}
+
+
+def run(perft_depth=3, search_depth=4, positions=BENCH_POSITIONS, out=sys.stdout, options=None):
+    report = {'python': platform.python_version(), 'perft': [], 'search': []}
+    if options is not None:
+        report['options'] = {'pvs': options.pvs, 'null_move': options.null_move, 'lmr': options.lmr}
+    for name, fen in positions:
+        result = dict(name=name, fen=fen, **bench_perft(fen, perft_depth))
+        report['perft'].append(result)
+        print(f"perft  {name:12} d{perft_depth} {result['nodes']:>9} nodes {result['seconds']:7.2f}s {result['nps']:>8} nps", file=out)
+    for name, fen in positions:
+        result = dict(name=name, fen=fen, **bench_search(fen, search_depth, options=options))
+        report['search'].append(result)
+        print(f"search {name:12} d{search_depth} {result['nodes']:>9} nodes {result['seconds']:7.2f}s {result['nps']:>8} nps"
+              f"  {result['move']} {result['score']}", file=out)
+    for kind in ('perft', 'search'):
+        nodes = sum(r['nodes'] for r in report[kind])
+        seconds = sum(r['seconds'] for r in report[kind])
+        report[kind + '_total'] = {'nodes': nodes, 'seconds': round(seconds, 4),
+                                   'nps': round(nodes / seconds) if seconds else 0}
+        print(f"{kind} total: {nodes} nodes {seconds:.2f}s {report[kind + '_total']['nps']} nps", file=out)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft and search benchmark for the IAminimax engine.')
+    parser.add_argument('--perft-depth', type=int, default=3)
+    parser.add_argument('--search-depth', type=int, default=4)
+    parser.add_argument('--json', metavar='PATH', help="write the report as JSON ('-' for stdout)")
+    parser.add_argument('--pvs', action='store_true', help='principal variation search')
+    parser.add_argument('--null-move', action='store_true', help='null-move pruning')
+    parser.add_argument('--lmr', action='store_true', help='late move reductions')
+    args = parser.parse_args(argv)
+
+    options = None
+    if args.pvs or args.null_move or args.lmr:
+        options = SearchOptions(pvs=args.pvs, null_move=args.null_move, lmr=args.lmr)
+    report = run(args.perft_depth, args.search_depth, out=sys.stderr if args.json == '-' else sys.stdout,
+                 options=options)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
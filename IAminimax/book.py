@@ -0,0 +1,73 @@
+import argparse
+import sys
+from collections import Counter
+
+import gamerecord
+from IA_chess import Board, BOOK_ENTRY, START_FEN, OpeningBook, move_name, parse_any_move
+
+
+def read_games(path):
+    # PGN (.pgn) and binary (.games) game records, or else one game per line, moves written
+    # as move_name() writes them or in SAN and '#' starting a comment. Records of other
+    # variants (the minichess self-play files) are skipped.
+    if path.endswith(('.pgn', '.games')):
+        other = 0
+        for game in gamerecord.read_games(path):
+            if not gamerecord.is_chess(game):
+                other += 1
+                continue
+            yield [m if isinstance(m, str) else move_name(m) for m in game.moves]
+        if other:
+            print(f"{path}: skipped {other} games of another variant", file=sys.stderr)
+        return
+    with open(path) as f:
+        for line in f:
+            moves = line.split('#', 1)[0].split()
+            if moves:
+                yield moves
+
+
+def build_book(games, path, max_ply=16, fen=START_FEN):
+    # Counts how often each move was played from each position in the first max_ply
+    # plies; the count is the move's weight. Returns the number of entries written.
+    counts = Counter()
+    for n, game in enumerate(games, 1):
+        board = Board()
+        board.set_fen(fen)
+        for name in game[:max_ply]:
+            move = parse_any_move(board, name)
+            if move is None:
+                raise ValueError(f"game {n}: illegal move {name}")
+            counts[board.hash, move] += 1
+            board.make_move(move)
+    with open(path, 'wb') as f:
+        for (key, move), weight in sorted(counts.items()):
+            f.write(BOOK_ENTRY.pack(key, move, min(weight, 0xFFFF)))
+    return len(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build an opening book for the IAminimax engine.')
+    parser.add_argument('games', nargs='*', help='PGN, binary or text game files (one game of move names per line)')
+    parser.add_argument('-o', '--output', default='book.bin')
+    parser.add_argument('--max-ply', type=int, default=16)
+    parser.add_argument('--probe', metavar='FEN', help='list the book moves for a position instead')
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        board = Board()
+        board.set_fen(args.probe)
+        book = OpeningBook(args.output)
+        for move, weight in sorted(book.moves(board), key=lambda mw: -mw[1]):
+            print(f"{move_name(move)} {weight}")
+        book.close()
+        return 0
+
+    games = (game for path in args.games for game in read_games(path))
+    entries = build_book(games, args.output, args.max_ply)
+    print(f"{entries} entries written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import datetime
+import re
+import struct
+
+# Game records: PGN, whose moves are written as given (IA_chess records SAN, from Board.san()),
+# and a compact binary form holding 16-bit move codes. Both writers append one finished game
+# at a time; both readers are generators that hold a single game in memory.
+# Games of another variant than chess carry PGN's Variant tag, such as play.py's 6x6 minichess
+# games with env_minichess.move_to_action() codes; readers of chess games skip them.
+
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_RE = re.compile(r'\{[^}]*\}?|;.*|\(|\)|\$\d+|[^\s(){};]+')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+
+MINICHESS_VARIANT = 'minichess6x6'
+
+BINARY_MAGIC = b'IAGR'
+# Per game: result index, tag bytes, move count; then the tags ("key\tvalue\n", UTF-8) and the moves.
+BINARY_GAME = struct.Struct('<BHH')
+
+
+class Game:
+    def __init__(self, tags=None, moves=None, result='*'):
+        self.tags = dict(tags or {})
+        self.moves = list(moves or [])
+        self.result = result
+
+    def __repr__(self):
+        return f"Game({self.tags.get('White', '?')} - {self.tags.get('Black', '?')}, {len(self.moves)} moves, {self.result})"
+
+
+def is_chess(game):
+    return game.tags.get('Variant', 'Standard').lower() in ('standard', 'chess')
+
+
+def new_game(white='?', black='?', event='?', **tags):
+    game = Game({'Event': event, 'Site': '?', 'Date': datetime.date.today().strftime('%Y.%m.%d'),
+                 'Round': '-', 'White': white, 'Black': black})
+    game.tags.update(tags)
+    return game
+
+
+class PGNWriter:
+    def __init__(self, path, mode='a'):
+        self.file = open(path, mode, encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, game):
+        tags = dict(game.tags, Result=game.result)
+        lines = [f'[{k} "{escape(tags.get(k, "?"))}"]' for k in SEVEN_TAG_ROSTER]
+        lines += [f'[{k} "{escape(v)}"]' for k, v in tags.items() if k not in SEVEN_TAG_ROSTER]
+        # Move numbers start from the FEN tag's side to move, when there is one.
+        black_first = len(tags.get('FEN', '').split()) > 1 and tags['FEN'].split()[1] == 'b'
+        tokens = []
+        for i, move in enumerate(game.moves):
+            ply = i + black_first
+            if ply % 2 == 0:
+                tokens.append(f"{ply // 2 + 1}.")
+            elif i == 0:
+                tokens.append(f"{ply // 2 + 1}...")
+            tokens.append(str(move))
+        tokens.append(game.result)
+        text, line = [], ''
+        for tok in tokens:
+            if line and len(line) + 1 + len(tok) > 79:
+                text.append(line)
+                line = tok
+            else:
+                line = f"{line} {tok}" if line else tok
+        text.append(line)
+        self.file.write('\n'.join(lines) + '\n\n' + '\n'.join(text) + '\n\n')
+        self.file.flush()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def read_pgn(f):
+    # Yields a Game per PGN game. Comments, NAGs, variations and move suffixes (!, ?) are skipped.
+    tags, moves = {}, []
+    in_comment = False
+    depth = 0
+    for line in f:
+        if in_comment:
+            end = line.find('}')
+            if end < 0:
+                continue
+            line = line[end + 1:]
+            in_comment = False
+        stripped = line.strip()
+        if not stripped or stripped.startswith('%'):
+            continue
+        if stripped.startswith('[') and depth == 0:
+            tag = TAG_RE.match(stripped)
+            if tag:
+                if moves:
+                    # A new game began without a result token: close the previous one.
+                    yield Game(tags, moves, tags.get('Result', '*'))
+                    tags, moves = {}, []
+                tags[tag.group(1)] = re.sub(r'\\(.)', r'\1', tag.group(2))
+                continue
+        for tok in TOKEN_RE.findall(line):
+            if tok.startswith('{'):
+                if not tok.endswith('}'):
+                    in_comment = True
+                continue
+            if tok.startswith(';') or tok.startswith('$'):
+                continue
+            if tok == '(':
+                depth += 1
+                continue
+            if tok == ')':
+                depth = max(0, depth - 1)
+                continue
+            if depth:
+                continue
+            if tok in RESULTS:
+                yield Game(tags, moves, tok)
+                tags, moves = {}, []
+                continue
+            tok = MOVE_NUMBER_RE.sub('', tok).rstrip('!?')
+            if tok:
+                moves.append(tok)
+    if tags or moves:
+        yield Game(tags, moves, tags.get('Result', '*'))
+
+
+class BinaryGameWriter:
+    # Moves are ints below 65536: IA_chess moves, or another variant's codes under a Variant tag.
+    def __init__(self, path, mode='ab'):
+        self.file = open(path, mode)
+        if self.file.tell() == 0:
+            self.file.write(BINARY_MAGIC)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, game):
+        tags = ''.join(f"{k}\t{v}\n" for k, v in game.tags.items()).encode('utf-8')
+        moves = struct.pack(f'<{len(game.moves)}H', *game.moves)
+        self.file.write(BINARY_GAME.pack(RESULTS.index(game.result), len(tags), len(game.moves)) + tags + moves)
+        self.file.flush()
+
+
+def read_binary(f):
+    if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("not a binary game file")
+    while True:
+        header = f.read(BINARY_GAME.size)
+        if len(header) < BINARY_GAME.size:
+            return
+        result, tag_bytes, n_moves = BINARY_GAME.unpack(header)
+        tags = {}
+        for line in f.read(tag_bytes).decode('utf-8').splitlines():
+            k, _, v = line.partition('\t')
+            tags[k] = v
+        moves = list(struct.unpack(f'<{n_moves}H', f.read(2 * n_moves)))
+        yield Game(tags, moves, RESULTS[result])
+
+
+def read_games(path):
+    # Streams the games of a PGN or binary file, told apart by the binary magic.
+    with open(path, 'rb') as f:
+        binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if binary:
+        with open(path, 'rb') as f:
+            yield from read_binary(f)
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield from read_pgn(f)
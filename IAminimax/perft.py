@@ -0,0 +1,95 @@
+import argparse
+import sys
+import time
+
+from IA_chess import Board, START_FEN, move_name
+
+# Node counts under this engine's rules: no castling and no en passant, so they differ
+# from the published tables wherever those apply (the start position matches to depth 4).
+# They were cross-checked against the original 8x8 mailbox generator.
+PERFT_POSITIONS = [
+    ('startpos', START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ('kiwipete', "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w",
+     {1: 46, 2: 1865, 3: 86585}),
+    ('endgame', "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w",
+     {1: 14, 2: 191, 3: 2810, 4: 43087}),
+    ('promotions', "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w",
+     {1: 6, 2: 258, 3: 9217}),
+    ('checks', "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w",
+     {1: 43, 2: 1452, 3: 59922}),
+    ('middlegame', "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w",
+     {1: 46, 2: 2079, 3: 89890}),
+]
+
+
+def perft(board, depth):
+    if depth == 0:
+        return 1
+    moves = board.all_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for m in moves:
+        board.make_move(m)
+        nodes += perft(board, depth - 1)
+        board.undo_move()
+    return nodes
+
+
+def divide(board, depth):
+    # Node count under each root move, the usual way to pin down a move generator bug.
+    counts = {}
+    for m in board.all_moves():
+        board.make_move(m)
+        counts[move_name(m)] = perft(board, depth - 1)
+        board.undo_move()
+    return counts
+
+
+def check_positions(max_depth=None, out=sys.stdout):
+    failures = 0
+    for name, fen, expected in PERFT_POSITIONS:
+        board = Board()
+        board.set_fen(fen)
+        for depth, want in sorted(expected.items()):
+            if max_depth is not None and depth > max_depth:
+                break
+            start = time.perf_counter()
+            got = perft(board, depth)
+            elapsed = time.perf_counter() - start
+            status = 'ok' if got == want else 'FAIL'
+            if got != want:
+                failures += 1
+            print(f"{status:4} {name:12} depth {depth}: {got} (expected {want}) {elapsed:.2f}s", file=out)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft for the IAminimax Board.')
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count under each root move')
+    parser.add_argument('--check', action='store_true', help='run the reference positions instead')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 1 if check_positions(args.depth) else 0
+
+    board = Board()
+    board.set_fen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(board, args.depth)
+        for name in sorted(counts):
+            print(f"{name}: {counts[name]}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f"nodes {nodes}  time {elapsed:.2f}s  nps {nodes / elapsed if elapsed else 0:.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import argparse
+import array
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+import gamerecord
+from IA_chess import (EVAL_WEIGHTS_PATH, PIECE_CHARS, PIECE_SQUARE_TABLES, PIECE_VALUES, START_FEN, Board, move_name,
+                      parse_any_move)
+
+# A position is encoded as up to 32 (feature, sign) pairs. Feature type*64 + sq indexes the
+# White piece-square tables (Black pieces use sq ^ 56 and sign -1), so a position's evaluation
+# is sum(sign * (value[type] + table[type][sq])), exactly what Board.evaluate() returns.
+N_FEATURES = 6 * 64
+PAD = N_FEATURES
+MAX_PIECES = 32
+FEN_FEATURES = {}
+for _t, _p in enumerate(PIECE_CHARS):
+    FEN_FEATURES[_p.upper()] = (_t * 64, 0, 1)
+    FEN_FEATURES[_p] = (_t * 64, 56, -1)
+RESULTS = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5}
+
+
+def parse_line(line):
+    # 'FEN result' with the result as 1-0 / 0-1 / 1/2-1/2 or a number from White's side,
+    # optionally in brackets or quotes, or an EPD line with a c9 "result" operation.
+    fields = line.split()
+    if 'c9' in fields:
+        i = fields.index('c9')
+        return ' '.join(fields[:i]), RESULTS[fields[i + 1].strip('";')]
+    token = fields[-1].strip('[]";')
+    result = RESULTS[token] if token in RESULTS else float(token)
+    return ' '.join(fields[:-1]).rstrip(';'), result
+
+
+def game_positions(path, skip_plies=8):
+    # (fen, result) for every position of every finished game in a PGN or binary game file,
+    # after the first skip_plies plies, which mostly come from the book. Games of other
+    # variants are skipped, and a game stops at its first unreadable move.
+    other = broken = 0
+    for game in gamerecord.read_games(path):
+        if not gamerecord.is_chess(game):
+            other += 1
+            continue
+        if game.result == '*':
+            continue
+        result = RESULTS[game.result]
+        board = Board()
+        board.set_fen(game.tags.get('FEN', START_FEN))
+        for ply, move in enumerate(game.moves):
+            move = parse_any_move(board, move if isinstance(move, str) else move_name(move))
+            if move is None:
+                broken += 1
+                break
+            board.make_move(move)
+            if ply + 1 >= skip_plies:
+                yield board.fen(), result
+    if other:
+        print(f"{path}: skipped {other} games of another variant", file=sys.stderr)
+    if broken:
+        print(f"{path}: {broken} games cut short at an illegal or unreadable move", file=sys.stderr)
+
+
+def labelled_positions(path):
+    if path.endswith(('.pgn', '.games')):
+        yield from game_positions(path)
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield parse_line(line)
+
+
+def encode_fen(fen, features, signs):
+    # Appends one position's padded feature list to the two arrays.
+    n = 0
+    sq = 0
+    for ch in fen.split(None, 1)[0]:
+        if ch == '/':
+            continue
+        if ch.isdigit():
+            sq += int(ch)
+            continue
+        base, flip, sign = FEN_FEATURES[ch]
+        features.append(base + (sq ^ flip))
+        signs.append(sign)
+        sq += 1
+        n += 1
+    if n > MAX_PIECES or sq != 64:
+        raise ValueError(f"bad position {fen!r}")
+    features.extend([PAD] * (MAX_PIECES - n))
+    signs.extend([0] * (MAX_PIECES - n))
+
+
+def load_positions(paths, limit=None):
+    # Streams the files into compact arrays: features (N, 32) int16, signs (N, 32) int8, results (N,).
+    features, signs, results = array.array('h'), array.array('b'), array.array('f')
+    for path in paths:
+        for fen, result in labelled_positions(path):
+            encode_fen(fen, features, signs)
+            results.append(result)
+            if limit is not None and len(results) >= limit:
+                break
+        if limit is not None and len(results) >= limit:
+            break
+    n = len(results)
+    return (np.frombuffer(features, np.int16).reshape(n, MAX_PIECES),
+            np.frombuffer(signs, np.int8).reshape(n, MAX_PIECES),
+            np.frombuffer(results, np.float32))
+
+
+def engine_weights():
+    # The engine's current material values (6,) and tables (6, 64), as floats to tune.
+    values = np.array([PIECE_VALUES[p] for p in PIECE_CHARS], np.float64)
+    tables = np.array([PIECE_SQUARE_TABLES[p] for p in PIECE_CHARS], np.float64)
+    return values, tables
+
+
+def feature_weights(values, tables):
+    # One weight per feature, material folded in, plus a zero for the padding slot.
+    return np.append((tables + values[:, None]).ravel(), 0.0)
+
+
+def evaluate_batch(features, signs, values, tables):
+    # Board.evaluate() for every encoded position in one vectorised pass.
+    w = feature_weights(values, tables)
+    return (w[features] * signs).sum(axis=1)
+
+
+def win_probability(evals, k):
+    return 1.0 / (1.0 + np.power(10.0, -k * evals / 400.0))
+
+
+def mean_error(features, signs, results, values, tables, k, batch=1 << 18):
+    total = 0.0
+    for i in range(0, len(results), batch):
+        p = win_probability(evaluate_batch(features[i:i+batch], signs[i:i+batch], values, tables), k)
+        total += float(((p - results[i:i+batch]) ** 2).sum())
+    return total / len(results)
+
+
+def fit_k(features, signs, results, values, tables):
+    # The scaling constant that best maps the current evaluation to results, by golden section.
+    lo, hi = 0.01, 4.0
+    g = (math.sqrt(5) - 1) / 2
+    for _ in range(30):
+        a, b = hi - g * (hi - lo), lo + g * (hi - lo)
+        if mean_error(features, signs, results, values, tables, a) < mean_error(features, signs, results, values, tables, b):
+            hi = b
+        else:
+            lo = a
+    return (lo + hi) / 2
+
+
+def tune(features, signs, results, values, tables, k, epochs=10, batch_size=16384, lr=1.0, l2=0.0,
+         seed=0, log=None):
+    # Minibatch Adam on the mean squared error between results and the win probability.
+    # Material values and the tables are fitted together; the king's value never moves,
+    # as every position has one king a side.
+    values, tables = values.copy(), tables.copy()
+    params = np.concatenate([values, tables.ravel()])
+    m = np.zeros_like(params)
+    v = np.zeros_like(params)
+    rng = np.random.default_rng(seed)
+    n = len(results)
+    scale = k * math.log(10) / 400.0
+    step = 0
+    for epoch in range(1, epochs + 1):
+        order = rng.permutation(n)
+        for i in range(0, n, batch_size):
+            idx = order[i:i+batch_size]
+            f, s, y = features[idx], signs[idx], results[idx]
+            p = win_probability(evaluate_batch(f, s, values, tables), k)
+            d = 2.0 * (p - y) * p * (1.0 - p) * scale
+            # d(eval)/d(table entry) is the signed occupancy; d(eval)/d(value) is the signed count.
+            grad_tables = np.bincount(f.ravel(), (s * d[:, None]).ravel(), N_FEATURES + 1)[:N_FEATURES] / len(idx)
+            grad_values = grad_tables.reshape(6, 64).sum(axis=1)
+            grad = np.concatenate([grad_values, grad_tables + l2 * params[6:]])
+            step += 1
+            m = 0.9 * m + 0.1 * grad
+            v = 0.999 * v + 0.001 * grad * grad
+            params -= lr * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-12)
+            values, tables = params[:6], params[6:].reshape(6, 64)
+        if log is not None:
+            print(f"epoch {epoch}: error {mean_error(features, signs, results, values, tables, k):.6f}", file=log)
+    return values.copy(), tables.copy()
+
+
+def write_weights(path, values, tables):
+    # JSON laid out like the tables in IA_chess.py: one rank per line, a8..h8 first.
+    values = {p: int(round(values[t])) for t, p in enumerate(PIECE_CHARS)}
+    tables = [[int(round(x)) for x in tables[t]] for t in range(6)]
+    with open(path, 'w') as f:
+        f.write('{"piece_values": ' + json.dumps(values) + ',\n "piece_square_tables": {\n')
+        for t, p in enumerate(PIECE_CHARS):
+            ranks = ',\n        '.join(', '.join(f"{x:4d}" for x in tables[t][r*8:r*8 + 8]) for r in range(8))
+            f.write(f'  "{p}": [{ranks}]' + (',\n' if t < 5 else '\n'))
+        f.write(' }}\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune the IAminimax evaluation against game results.')
+    parser.add_argument('data', nargs='+', help="files of 'FEN result' lines (or EPD with c9), or .pgn / .games game records")
+    parser.add_argument('-o', '--output', default=EVAL_WEIGHTS_PATH, help='weights file the engine loads at startup')
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=16384)
+    parser.add_argument('--lr', type=float, default=1.0, help='Adam step size, in centipawns')
+    parser.add_argument('--l2', type=float, default=0.0, help='pull of the tables towards zero')
+    parser.add_argument('--k', type=float, help='fixed scaling constant instead of fitting one')
+    parser.add_argument('--limit', type=int, help='use only the first N positions')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    features, signs, results = load_positions(args.data, args.limit)
+    if len(results) == 0:
+        parser.error("no labelled positions found")
+    print(f"{len(results)} positions encoded in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    values, tables = engine_weights()
+    k = args.k if args.k is not None else fit_k(features, signs, results, values, tables)
+    print(f"K = {k:.4f}, error {mean_error(features, signs, results, values, tables, k):.6f}", file=sys.stderr)
+    values, tables = tune(features, signs, results, values, tables, k, args.epochs, args.batch, args.lr, args.l2,
+                          log=sys.stderr)
+    write_weights(args.output, values, tables)
+    print(f"weights written to {args.output} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,44 +2,63 @@ import random
 import numpy as np
 import pickle
 
+from env_minichess import N_ACTIONS, move_to_action, position_key
+
+# Q-table keys are single ints: the position's Zobrist key xor a random key per action.
+_action_rng = random.Random(0xAC710)
+ACTION_KEYS = [_action_rng.getrandbits(64) for _ in range(N_ACTIONS)]
+
 class QLearningAgent:
-    def __init__(self, alpha=0.1, gamma=0.99, epsilon=0.2):
-        self.q_table = {}  
+    def __init__(self, alpha=0.1, gamma=0.99, epsilon=0.2, tablebase=None, q_table=None):
+        # q_table: any store with get(key, default) and item assignment, e.g. a bounded qtable.QTable.
+        self.q_table = {} if q_table is None else q_table
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
+        # Optional MiniChessTablebase: positions it covers are played from the tables instead of the Q-table.
+        self.tablebase = tablebase
 
     def get_state_key(self, board, color_board, current_player):
-        return tuple(board.flatten()), tuple(color_board.flatten()), current_player
-
-    def choose_action(self, state, valid_actions):
-        state_key = self.get_state_key(*state)
+        return position_key(board, color_board, current_player)
 
+    def choose_action(self, state, valid_actions, state_key=None, turns_left=None):
+        # state_key: the env's incrementally kept key (MiniChessEnv6x6.key), to skip hashing the boards.
+        # turns_left: plies left before the env's turn limit, for the tablebase.
         if not valid_actions:
             return None  
 
+        if self.tablebase is not None:
+            move = self.tablebase.best_move(*state, valid_actions, turns_left)
+            if move is not None:
+                return move
+
         if random.random() < self.epsilon:
             return random.choice(valid_actions)
 
-        q_values = [self.q_table.get((state_key, a), 0) for a in valid_actions]
+        if state_key is None:
+            state_key = self.get_state_key(*state)
+        q_values = [self.q_table.get(state_key ^ ACTION_KEYS[move_to_action(a)], 0) for a in valid_actions]
         max_q = max(q_values)
         best_actions = [a for a, q in zip(valid_actions, q_values) if q == max_q]
         return random.choice(best_actions)
 
 
-    def learn(self, state, action, reward, next_state, done, valid_next_actions):
-        state_key = self.get_state_key(*state)
-        next_key = self.get_state_key(*next_state)
+    def learn(self, state, action, reward, next_state, done, valid_next_actions, state_key=None, next_key=None):
+        if state_key is None:
+            state_key = self.get_state_key(*state)
+        key = state_key ^ ACTION_KEYS[move_to_action(action)]
 
-        q_sa = self.q_table.get((state_key, action), 0)
+        q_sa = self.q_table.get(key, 0)
 
         if done:
             target = reward
         else:
-            next_qs = [self.q_table.get((next_key, a), 0) for a in valid_next_actions]
+            if next_key is None:
+                next_key = self.get_state_key(*next_state)
+            next_qs = [self.q_table.get(next_key ^ ACTION_KEYS[move_to_action(a)], 0) for a in valid_next_actions]
             target = reward + self.gamma * max(next_qs, default=0)
 
-        self.q_table[(state_key, action)] = q_sa + self.alpha * (target - q_sa)
+        self.q_table[key] = q_sa + self.alpha * (target - q_sa)
 
     def save(self, filename):
         with open(filename, 'wb') as f:
@@ -48,6 +67,17 @@ class QLearningAgent:
     def load(self, filename):
         with open(filename, 'rb') as f:
             self.q_table = pickle.load(f)
+        if isinstance(self.q_table, dict) and self.q_table and isinstance(next(iter(self.q_table)), tuple):
+            self.q_table = _convert_tuple_keys(self.q_table)
+
+
+def _convert_tuple_keys(q_table):
+    # Tables saved before the integer keys: ((board, color_board, player), move) -> q.
+    converted = {}
+    for ((board, color_board, player), move), q in q_table.items():
+        state_key = position_key(np.array(board), np.array(color_board), player)
+        converted[state_key ^ ACTION_KEYS[move_to_action(move)]] = q
+    return converted
 
 
 
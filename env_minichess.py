@@ -1,4 +1,6 @@
 # chess_ai/env_minichess.py
+import random
+
 import numpy as np
 
 EMPTY, PAWN, ROOK, KNIGHT = 0, 1, 2, 3
@@ -6,6 +8,41 @@ WHITE, BLACK = 1, -1
 
 PIECE_NAMES = {EMPTY: '.', PAWN: 'P', ROOK: 'R', KNIGHT: 'N'}
 PIECE_VALUES = {PAWN: 1, KNIGHT: 3, ROOK: 5}
+# The game stops after this many plies and is decided on material.
+MAX_TURNS = 150
+
+# Precomputed for every square: knight targets, and rook rays as lists of squares walking out.
+KNIGHT_TARGETS = [[[(x + dx, y + dy) for dx, dy in [(2,1),(1,2),(-1,2),(-2,1),(-2,-1),(-1,-2),(1,-2),(2,-1)]
+                    if 0 <= x + dx < 6 and 0 <= y + dy < 6] for y in range(6)] for x in range(6)]
+ROOK_RAYS = [[[ray for ray in ([(x + dx*s, y + dy*s) for s in range(1, 6) if 0 <= x + dx*s < 6 and 0 <= y + dy*s < 6]
+                               for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]) if ray]
+              for y in range(6)] for x in range(6)]
+
+# Actions as integers: from_square*36 + to_square, with square = x*6 + y.
+N_SQUARES = 36
+N_ACTIONS = N_SQUARES * N_SQUARES
+
+def action_to_move(action):
+    a, b = divmod(int(action), N_SQUARES)
+    return divmod(a, 6), divmod(b, 6)
+
+def move_to_action(move):
+    (x1, y1), (x2, y2) = move
+    return (x1*6 + y1) * N_SQUARES + x2*6 + y2
+
+# Zobrist keys per square and square code piece*3 + colour + 1. The colour counts on its own:
+# the start position's empty coloured squares play differently from plain empty ones.
+# An empty uncoloured square (code 1) hashes to 0. Fixed seed so saved Q-tables stay valid.
+_zobrist_rng = random.Random(0x5EED)
+ZOBRIST_SQUARES = [[0 if code == 1 else _zobrist_rng.getrandbits(64) for code in range(12)] for _ in range(N_SQUARES)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_rng.getrandbits(64)
+_ZOBRIST_ARRAY = np.array(ZOBRIST_SQUARES, dtype=np.uint64)
+
+def position_key(board, color_board, current_player):
+    # The 64-bit Zobrist key of a position, from scratch; MiniChessEnv6x6.key keeps it up to date.
+    codes = (np.asarray(board) * 3 + np.asarray(color_board) + 1).ravel()
+    key = int(np.bitwise_xor.reduce(_ZOBRIST_ARRAY[np.arange(N_SQUARES), codes]))
+    return key ^ ZOBRIST_BLACK_TO_MOVE if current_player == BLACK else key
 
 class MiniChessEnv6x6:
     def __init__(self):
@@ -36,70 +73,67 @@ class MiniChessEnv6x6:
         self.current_player = WHITE
         self.done = False
         self.turn_count = 0
+        self._index_pieces()
         return self.get_state()
 
+    def set_position(self, board, color_board, current_player):
+        # For positions set up by hand: rebuilds the piece lists and the move cache.
+        self.board = np.array(board, dtype=int)
+        self.color_board = np.array(color_board, dtype=int)
+        self.current_player = current_player
+        self.done = False
+        self._index_pieces()
+
+    def _index_pieces(self):
+        # Squares holding a piece, per colour; the start position's empty coloured squares are not in them.
+        self.pieces = {WHITE: set(), BLACK: set()}
+        for x, y in zip(*np.nonzero(self.board)):
+            self.pieces[int(self.color_board[x][y])].add((int(x), int(y)))
+        self.key = position_key(self.board, self.color_board, self.current_player)
+        self.valid_moves = self._generate_moves()
+
     def get_state(self):
         return self.board.copy(), self.color_board.copy(), self.current_player
 
     def get_valid_moves(self):
-        moves = []
-        for x in range(6):
-            for y in range(6):
-                if self.color_board[x][y] == self.current_player:
-                    piece = self.board[x][y]
-                    if piece == PAWN:
-                        piece_moves = self._pawn_moves(x, y)
-                    elif piece == ROOK:
-                        piece_moves = self._rook_moves(x, y)
-                    elif piece == KNIGHT:
-                        piece_moves = self._knight_moves(x, y)
-                    else:
-                        piece_moves = []
-                    moves.extend(piece_moves)
-        return moves
+        # Cached: computed once per position by reset() and step().
+        return self.valid_moves
 
-    def _pawn_moves(self, x, y):
+    def _generate_moves(self):
+        board = self.board.tolist()
+        colors = self.color_board.tolist()
+        player = self.current_player
         moves = []
-        dx = -1 if self.current_player == WHITE else 1
-        nx = x + dx
-        if 0 <= nx < 6:
-            if self.board[nx][y] == 0:
-                moves.append(((x, y), (nx, y)))
-            for dy in [-1, 1]:
-                ny = y + dy
-                if 0 <= ny < 6 and self.color_board[nx][ny] == -self.current_player:
-                    moves.append(((x, y), (nx, ny)))
-        return moves
-
-    def _rook_moves(self, x, y):
-        moves = []
-        for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
-            step = 1
-            while True:
-                nx, ny = x + dx*step, y + dy*step
-                if 0 <= nx < 6 and 0 <= ny < 6:
-                    if self.board[nx][ny] == 0:
-                        moves.append(((x, y), (nx, ny)))
-                    elif self.color_board[nx][ny] == -self.current_player:
+        for x, y in sorted(self.pieces[player]):
+            piece = board[x][y]
+            if piece == PAWN:
+                nx = x - 1 if player == WHITE else x + 1
+                if 0 <= nx < 6:
+                    if board[nx][y] == 0:
+                        moves.append(((x, y), (nx, y)))
+                    for ny in (y - 1, y + 1):
+                        if 0 <= ny < 6 and colors[nx][ny] == -player:
+                            moves.append(((x, y), (nx, ny)))
+            elif piece == ROOK:
+                for ray in ROOK_RAYS[x][y]:
+                    for nx, ny in ray:
+                        if board[nx][ny] == 0:
+                            moves.append(((x, y), (nx, ny)))
+                        else:
+                            if colors[nx][ny] == -player:
+                                moves.append(((x, y), (nx, ny)))
+                            break
+            elif piece == KNIGHT:
+                for nx, ny in KNIGHT_TARGETS[x][y]:
+                    if colors[nx][ny] != player:
                         moves.append(((x, y), (nx, ny)))
-                        break
-                    else:
-                        break
-                else:
-                    break
-                step += 1
         return moves
 
-    def _knight_moves(self, x, y):
-        moves = []
-        for dx, dy in [(2,1),(1,2),(-1,2),(-2,1),(-2,-1),(-1,-2),(1,-2),(2,-1)]:
-            nx, ny = x + dx, y + dy
-            if 0 <= nx < 6 and 0 <= ny < 6:
-                if self.color_board[nx][ny] != self.current_player:
-                    moves.append(((x, y), (nx, ny)))
-        return moves
+    def material(self, color):
+        return sum(PIECE_VALUES[self.board[x][y]] for x, y in self.pieces[color])
 
     def step(self, move):
+        # Returns (state, reward, done, valid moves of the side now to move; empty once done).
         (x1, y1), (x2, y2) = move
         reward = 0.0
 
@@ -109,6 +143,16 @@ class MiniChessEnv6x6:
         if captured_color == -self.current_player:
             reward += PIECE_VALUES.get(captured_piece, 0)
 
+        # The moving piece keeps its code; the from square ends up empty and uncoloured (key 0).
+        moving = self.board[x1][y1] * 3 + self.current_player + 1
+        target = captured_piece * 3 + captured_color + 1
+        z1, z2 = ZOBRIST_SQUARES[x1*6 + y1], ZOBRIST_SQUARES[x2*6 + y2]
+        self.key ^= z1[moving] ^ z2[target] ^ z2[moving] ^ ZOBRIST_BLACK_TO_MOVE
+
+        if captured_piece != EMPTY:
+            self.pieces[int(captured_color)].discard((x2, y2))
+        self.pieces[self.current_player].discard((x1, y1))
+        self.pieces[self.current_player].add((x2, y2))
         self.board[x2][y2] = self.board[x1][y1]
         self.color_board[x2][y2] = self.current_player
         self.board[x1][y1] = EMPTY
@@ -116,19 +160,21 @@ class MiniChessEnv6x6:
 
         self.current_player *= -1
         self.turn_count += 1
+        self.valid_moves = []
 
         # Vérifier si l'adversaire a encore des pièces
         if not np.any(self.color_board == self.current_player):
             self.done = True
             print(f"\U0001F3C6 Joueur {'Blanc' if -self.current_player == WHITE else 'Noir'} gagne (plus de pièces ennemies)!")
             reward += 20.0
-            return self.get_state(), reward, self.done
+            return self.get_state(), reward, self.done, self.valid_moves
 
         # Vérifier s'il y a encore des coups possibles
-        if len(self.get_valid_moves()) == 0:
+        self.valid_moves = self._generate_moves()
+        if len(self.valid_moves) == 0:
             self.done = True
-            white_score = sum(PIECE_VALUES.get(self.board[i][j], 0) for i in range(6) for j in range(6) if self.color_board[i][j] == WHITE)
-            black_score = sum(PIECE_VALUES.get(self.board[i][j], 0) for i in range(6) for j in range(6) if self.color_board[i][j] == BLACK)
+            white_score = self.material(WHITE)
+            black_score = self.material(BLACK)
             if white_score > black_score:
                 print("\U0001F3C1 Fin de partie : Blanc gagne par majorité de valeur.")
                 reward += 15.0 if self.current_player == BLACK else -15.0
@@ -137,14 +183,15 @@ class MiniChessEnv6x6:
                 reward += 15.0 if self.current_player == WHITE else -15.0
             else:
                 print("⚖️ Match nul (égalité parfaite).")
-            return self.get_state(), reward, self.done
+            return self.get_state(), reward, self.done, self.valid_moves
 
         # Si 45 tours sont passés, fin de partie automatique
-        if self.turn_count >= 150:
+        if self.turn_count >= MAX_TURNS:
             self.done = True
-            white_score = sum(PIECE_VALUES.get(self.board[i][j], 0) for i in range(6) for j in range(6) if self.color_board[i][j] == WHITE)
-            black_score = sum(PIECE_VALUES.get(self.board[i][j], 0) for i in range(6) for j in range(6) if self.color_board[i][j] == BLACK)
-            print("⏱ Limite de 150 tours atteinte.")
+            self.valid_moves = []
+            white_score = self.material(WHITE)
+            black_score = self.material(BLACK)
+            print(f"⏱ Limite de {MAX_TURNS} tours atteinte.")
             if white_score > black_score:
                 print("\U0001F3C1 Fin de partie : Blanc gagne par majorité de matériel.")
                 reward += 15.0 if self.current_player == BLACK else -15.0
@@ -153,9 +200,9 @@ class MiniChessEnv6x6:
                 reward += 15.0 if self.current_player == WHITE else -15.0
             else:
                 print("⚖️ Match nul (égalité de matériel).")
-            return self.get_state(), reward, self.done
+            return self.get_state(), reward, self.done, self.valid_moves
 
-        return self.get_state(), reward, self.done
+        return self.get_state(), reward, self.done, self.valid_moves
 
     def render(self):
         print("\n  A B C D E F")
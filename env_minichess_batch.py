@@ -0,0 +1,201 @@
+# N games of MiniChessEnv6x6 stepped together with array operations.
+# Same rules, rewards and start position as env_minichess, without the printing. Boards are
+# (N, 36) int8 arrays, square = x*6 + y; an action is from_square*36 + to_square.
+import time
+
+import numpy as np
+
+from env_minichess import (EMPTY, PAWN, ROOK, KNIGHT, WHITE, BLACK, PIECE_VALUES, N_SQUARES, N_ACTIONS, MAX_TURNS,
+                           MiniChessEnv6x6, action_to_move)
+
+VALUES = np.zeros(4, np.int16)
+for _p, _v in PIECE_VALUES.items():
+    VALUES[_p] = _v
+
+def _square(x, y):
+    return x*6 + y if 0 <= x < 6 and 0 <= y < 6 else -1
+
+# Every (from, to) pair a piece could use on an empty board, as parallel arrays.
+KNIGHT_FROM, KNIGHT_TO = [], []
+PAWN_PAIRS = {WHITE: ([], [], [], []), BLACK: ([], [], [], [])}    # push from, push to, capture from, capture to
+# ROOK_RAYS[d, k, s]: the square k+1 steps from s in direction d, or -1 off the board.
+ROOK_RAYS = np.full((4, 5, N_SQUARES), -1, np.int64)
+for _s in range(N_SQUARES):
+    _x, _y = divmod(_s, 6)
+    for _dx, _dy in [(2,1),(1,2),(-1,2),(-2,1),(-2,-1),(-1,-2),(1,-2),(2,-1)]:
+        _t = _square(_x + _dx, _y + _dy)
+        if _t >= 0:
+            KNIGHT_FROM.append(_s)
+            KNIGHT_TO.append(_t)
+    for _color, _dx in ((WHITE, -1), (BLACK, 1)):
+        _pairs = PAWN_PAIRS[_color]
+        _t = _square(_x + _dx, _y)
+        if _t >= 0:
+            _pairs[0].append(_s)
+            _pairs[1].append(_t)
+        for _dy in (-1, 1):
+            _t = _square(_x + _dx, _y + _dy)
+            if _t >= 0:
+                _pairs[2].append(_s)
+                _pairs[3].append(_t)
+    for _d, (_dx, _dy) in enumerate([(-1,0),(1,0),(0,-1),(0,1)]):
+        for _k in range(5):
+            ROOK_RAYS[_d, _k, _s] = _square(_x + _dx*(_k+1), _y + _dy*(_k+1))
+KNIGHT_FROM, KNIGHT_TO = np.array(KNIGHT_FROM), np.array(KNIGHT_TO)
+PAWN_PAIRS = {c: tuple(np.array(a) for a in pairs) for c, pairs in PAWN_PAIRS.items()}
+ROOK_ON = ROOK_RAYS >= 0
+ROOK_TARGETS = np.where(ROOK_ON, ROOK_RAYS, 0)
+ROOK_ACTIONS = (np.arange(N_SQUARES) * N_SQUARES + ROOK_RAYS)[ROOK_ON]
+
+
+def start_position():
+    env = MiniChessEnv6x6()
+    return env.board.astype(np.int8).ravel(), env.color_board.astype(np.int8).ravel()
+
+
+class MiniChessBatchEnv6x6:
+    def __init__(self, n, auto_reset=True):
+        self.n = n
+        self.auto_reset = auto_reset
+        self.start_board, self.start_color = start_position()
+        self.reset()
+
+    def reset(self, games=None):
+        # Resets every game, or the games selected by an index or boolean array.
+        if games is None:
+            self.board = np.tile(self.start_board, (self.n, 1))
+            self.color_board = np.tile(self.start_color, (self.n, 1))
+            self.current_player = np.full(self.n, WHITE, np.int8)
+            self.turn_count = np.zeros(self.n, np.int16)
+            self.done = np.zeros(self.n, bool)
+            # Outcome of the last finished game in each slot: WHITE, BLACK, 0 for a draw.
+            self.results = np.zeros(self.n, np.int8)
+            self.mask = self.valid_move_mask()
+            self.start_mask = self.mask[0].copy()
+        else:
+            self.board[games] = self.start_board
+            self.color_board[games] = self.start_color
+            self.current_player[games] = WHITE
+            self.turn_count[games] = 0
+            self.done[games] = False
+            self.mask[games] = self.start_mask
+        return self.get_state()
+
+    def get_state(self):
+        return (self.board.reshape(self.n, 6, 6).copy(), self.color_board.reshape(self.n, 6, 6).copy(),
+                self.current_player.copy())
+
+    def game_state(self, i):
+        # Game i as MiniChessEnv6x6.get_state() returns it.
+        return (self.board[i].reshape(6, 6).astype(int), self.color_board[i].reshape(6, 6).astype(int),
+                int(self.current_player[i]))
+
+    def material(self):
+        values = VALUES[self.board]
+        return ((values * (self.color_board == WHITE)).sum(axis=1),
+                (values * (self.color_board == BLACK)).sum(axis=1))
+
+    def valid_move_mask(self):
+        # (N, 36*36) bool: the valid actions of the side to move in every game.
+        player = self.current_player[:, None]
+        own = self.color_board == player
+        enemy = self.color_board == -player
+        empty = self.board == EMPTY
+        mask = np.zeros((self.n, N_ACTIONS), bool)
+
+        knights = own & (self.board == KNIGHT)
+        mask[:, KNIGHT_FROM * N_SQUARES + KNIGHT_TO] = knights[:, KNIGHT_FROM] & ~own[:, KNIGHT_TO]
+
+        pawns = own & (self.board == PAWN)
+        for color, (push_from, push_to, take_from, take_to) in PAWN_PAIRS.items():
+            to_move = player == color
+            mask[:, push_from * N_SQUARES + push_to] |= to_move & pawns[:, push_from] & empty[:, push_to]
+            mask[:, take_from * N_SQUARES + take_to] |= to_move & pawns[:, take_from] & enemy[:, take_to]
+
+        # Walk the rays of every square at once; a ray stays open while its squares are empty.
+        rooks = own & (self.board == ROOK)
+        reach = np.zeros((self.n, 4, 5, N_SQUARES), bool)
+        for d in range(4):
+            open_ray = rooks
+            for k in range(5):
+                t = ROOK_TARGETS[d, k]
+                reach[:, d, k] = open_ray & (empty[:, t] | enemy[:, t])
+                open_ray = open_ray & empty[:, t]
+        mask[:, ROOK_ACTIONS] |= reach[:, ROOK_ON]
+        return mask
+
+    def valid_moves(self, i):
+        # Game i's moves in MiniChessEnv6x6 form, ((x1, y1), (x2, y2)).
+        return [action_to_move(a) for a in np.flatnonzero(self.mask[i])]
+
+    def random_actions(self, rng):
+        # One uniformly random valid action per game (0 for finished games).
+        weights = rng.random((self.n, N_ACTIONS)) * self.mask
+        return weights.argmax(axis=1)
+
+    def step(self, actions):
+        # Plays one action in every unfinished game. Returns (state, rewards, dones) with the
+        # rewards of MiniChessEnv6x6.step() for the side that moved. With auto_reset, the
+        # games that ended are started again; their outcome stays in results.
+        actions = np.asarray(actions)
+        live = ~self.done
+        rows = np.flatnonzero(live)
+        frm, to = np.divmod(actions[rows], N_SQUARES)
+        player = self.current_player[rows]
+        rewards = np.zeros(self.n, np.float32)
+
+        captured = self.color_board[rows, to] == -player
+        rewards[rows] += np.where(captured, VALUES[self.board[rows, to]], 0)
+        self.board[rows, to] = self.board[rows, frm]
+        self.color_board[rows, to] = player
+        self.board[rows, frm] = EMPTY
+        self.color_board[rows, frm] = 0
+        self.current_player[rows] = -player
+        self.turn_count[rows] += 1
+
+        self.mask = self.valid_move_mask()
+        mover = np.zeros(self.n, np.int8)
+        mover[rows] = player
+        wiped = live & ~(self.color_board == -mover[:, None]).any(axis=1)
+        stuck = live & ~wiped & ~self.mask.any(axis=1)
+        timeout = live & ~wiped & ~stuck & (self.turn_count >= MAX_TURNS)
+        white, black = self.material()
+        by_material = np.sign(white.astype(np.int32) - black).astype(np.int8)
+        on_material = stuck | timeout
+
+        rewards[wiped] += 20.0
+        rewards[on_material] += 15.0 * by_material[on_material] * mover[on_material]
+        dones = wiped | on_material
+        self.results[wiped] = mover[wiped]
+        self.results[on_material] = by_material[on_material]
+        self.done |= dones
+        if self.auto_reset and dones.any():
+            self.reset(dones)
+        return self.get_state(), rewards, dones
+
+
+def benchmark(n=1024, steps=300, seed=0):
+    # Random self-play throughput, batched and one env at a time, in plies per second.
+    rng = np.random.default_rng(seed)
+    env = MiniChessBatchEnv6x6(n)
+    start = time.perf_counter()
+    for _ in range(steps):
+        env.step(env.random_actions(rng))
+    batched = n * steps / (time.perf_counter() - start)
+
+    import contextlib, io, random
+    single = MiniChessEnv6x6()
+    plies = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while time.perf_counter() - start < 2.0:
+            _, _, done, _ = single.step(random.choice(single.get_valid_moves()))
+            plies += 1
+            if done:
+                single.reset()
+    return batched, plies / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    batched, single = benchmark()
+    print(f"batched: {batched:,.0f} plies/s   single env: {single:,.0f} plies/s")
@@ -1,39 +1,67 @@
-from env_minichess import MiniChessEnv6x6
+from env_minichess import MiniChessEnv6x6, WHITE, BLACK, MAX_TURNS, move_to_action
 from agent_qlearning import QLearningAgent
+from tablebase_minichess import MiniChessTablebase
+from qtable import QTable
+from IAminimax.gamerecord import MINICHESS_VARIANT, BinaryGameWriter, new_game
+import os
 import time
 
-agent_white = QLearningAgent()
-agent_black = QLearningAgent()
+def game_result(env):
+    # Same rule as the environment: the side with more material left wins.
+    white, black = env.material(WHITE), env.material(BLACK)
+    return '1-0' if white > black else '0-1' if black > white else '1/2-1/2'
+
+# Endgame tables from "python tablebase_minichess.py", used when present.
+tablebase = MiniChessTablebase("tablebase") if os.path.isdir("tablebase") else None
+# Each agent keeps at most max_q_entries Q-values, dropping the least visited; the tables grow
+# as they fill, up to 16 bytes a slot for max_q_entries / 0.7 slots (about 270 MB).
+max_q_entries = 10_000_000
+agent_white = QLearningAgent(tablebase=tablebase, q_table=QTable(max_q_entries))
+agent_black = QLearningAgent(tablebase=tablebase, q_table=QTable(max_q_entries))
 
 episodes = 1000000
 save_every = 50000
+# One game in record_every is appended to the binary game file.
+record_every = 100
+os.makedirs("model", exist_ok=True)
+records = BinaryGameWriter("model/selfplay.games")
 
 for episode in range(1, episodes + 1):
     env = MiniChessEnv6x6()
     state = env.get_state()
     done = False
     turn = 0
+    record = new_game('agent_white', 'agent_black', 'selfplay', Round=str(episode), Variant=MINICHESS_VARIANT) if episode % record_every == 0 else None
+
+    valid_moves = env.get_valid_moves()
+    key = env.key
 
     while not done:
-        valid_moves = env.get_valid_moves()
         agent = agent_white if state[2] == 1 else agent_black
-        
-
-
-        action = agent.choose_action(state, valid_moves)
-        action = agent.choose_action(state, valid_moves)
+        action = agent.choose_action(state, valid_moves, key, MAX_TURNS - env.turn_count)
         if action is None:
             print("Aucun coup possible, abandon ou match nul.")
             break
-        next_state, reward, done = env.step(action)
+        # step() hands back the next player's moves, already generated for its end-of-game check.
+        next_state, reward, done, next_valid_moves = env.step(action)
+        if record is not None:
+            record.moves.append(move_to_action(action))
 
-        next_valid_moves = env.get_valid_moves() if not done else []
-        agent.learn(state, action, reward, next_state, done, next_valid_moves)
+        agent.learn(state, action, reward, next_state, done, next_valid_moves, key, env.key)
 
         state = next_state
+        valid_moves = next_valid_moves
+        key = env.key
         turn += 1
 
+    if record is not None:
+        record.result = game_result(env)
+        records.write(record)
+
     if episode % save_every == 0:
         print(f"Episode {episode} finished in {turn} turns.")
+        print(f"Q-tables: white {agent_white.q_table.stats()}, black {agent_black.q_table.stats()}")
         agent_white.save("model/white_agent.pkl")
         agent_black.save("model/black_agent.pkl")
+
+records.close()
@@ -97,8 +97,7 @@ def ai_move():
     if action is None:
         game_over = True
         return
-    next_state, reward, done = env.step(action)
-    next_valid_moves = env.get_valid_moves()
+    next_state, reward, done, next_valid_moves = env.step(action)
     agent.learn(state, action, reward, next_state, done, next_valid_moves)
     state = next_state
     prev_state = state
@@ -138,7 +137,7 @@ while running:
             else:
                 move = (selected, pos)
                 if move in valid_moves:
-                    state, reward, done = env.step(move)
+                    state, reward, done, _ = env.step(move)
                     if done:
                         print("Partie terminée.")
                         agent.save("black_agent.pkl")
@@ -12,20 +12,23 @@ for episode in range(1, episodes + 1):
     done = False
     turn = 0
 
+    valid_moves = env.get_valid_moves()
+    key = env.key
+
     while not done:
-        valid_moves = env.get_valid_moves()
         if not valid_moves:
             print("Aucun coup possible, match nul.")
             break
 
         agent = agent_white if state[2] == 1 else agent_black
-        action = agent.choose_action(state, valid_moves)
-        next_state, reward, done = env.step(action)
+        action = agent.choose_action(state, valid_moves, key)
+        next_state, reward, done, next_valid_moves = env.step(action)
 
-        next_valid_moves = env.get_valid_moves() if not done else []
-        agent.learn(state, action, reward, next_state, done, next_valid_moves)
+        agent.learn(state, action, reward, next_state, done, next_valid_moves, key, env.key)
 
         state = next_state
+        valid_moves = next_valid_moves
+        key = env.key
         turn += 1
 
     if episode == episodes:
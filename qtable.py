@@ -0,0 +1,288 @@
+# Bounded Q-value store for QLearningAgent, in flat arrays instead of a dict.
+#
+# Open addressing with linear probing over a power-of-two number of slots: uint64 keys
+# (0 marks a free slot), float32 values and uint32 visit counts (number of updates), plus
+# uint64 last-use stamps for the 'recent' policy, 16 to 24 bytes a slot. The table doubles as
+# it fills, up to the size max_entries needs. Once max_entries are stored, the evict_fraction
+# least visited (policy 'visits') or least recently used ('recent') entries are dropped together
+# and the survivors rehashed, so an eviction costs one pass over the table. Pickles hold the
+# stored entries only. Lookups run in Python, so updates cost about three times a dict's.
+import argparse
+import sys
+import time
+from array import array
+
+import numpy as np
+
+POLICIES = ('visits', 'recent')
+
+
+def _power_of_two(n):
+    return 1 << max(4, int(np.ceil(np.log2(n))))
+
+
+class QTable:
+    def __init__(self, max_entries=1_000_000, policy='visits', evict_fraction=0.125, max_load=0.7,
+                 initial_capacity=1024):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown eviction policy {policy!r}, expected one of {POLICIES}")
+        if max_entries < 1 or not 0 < evict_fraction <= 1 or not 0 < max_load < 1:
+            raise ValueError("need max_entries >= 1, 0 < evict_fraction <= 1 and 0 < max_load < 1")
+        self.max_entries = max_entries
+        self.policy = policy
+        self.evict_fraction = evict_fraction
+        self.max_load = max_load
+        # Starts small and doubles whenever the load passes max_load, up to the size max_entries needs.
+        self.max_capacity = _power_of_two(max_entries / max_load)
+        self.count = 0
+        self.clock = 0
+        self.evictions = 0
+        self._allocate(min(_power_of_two(initial_capacity), self.max_capacity))
+
+    def _allocate(self, capacity):
+        # array.array storage: scalar reads return plain Python numbers, much faster than NumPy
+        # scalars. self.keys etc. are NumPy views of the same memory for the vectorized paths.
+        self.mask = capacity - 1
+        # Past grow_at, a new key doubles the table, or evicts once it is at max_capacity.
+        self.grow_at = self.max_entries if capacity == self.max_capacity else int(capacity * self.max_load)
+        self._keys = array('Q', bytes(8 * capacity))
+        self._values = array('f', bytes(4 * capacity))
+        self._visits = array('I', bytes(4 * capacity))
+        self.keys = np.frombuffer(self._keys, np.uint64)
+        self.values = np.frombuffer(self._values, np.float32)
+        self.visits = np.frombuffer(self._visits, np.uint32)
+        if self.policy == 'recent':
+            self._stamps = array('Q', bytes(8 * capacity))
+            self.stamps = np.frombuffer(self._stamps, np.uint64)
+        else:
+            self._stamps = self.stamps = None
+        # The slot get() last probed: learn() reads a key and then assigns it.
+        self._last = (None, 0)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def capacity(self):
+        return self.mask + 1
+
+    @property
+    def load_factor(self):
+        return self.count / self.capacity
+
+    def stats(self):
+        return {'size': self.count, 'capacity': self.capacity, 'load_factor': round(self.load_factor, 4),
+                'max_entries': self.max_entries, 'evictions': self.evictions, 'policy': self.policy}
+
+    def __getstate__(self):
+        # Pickles the stored entries only; the slots are rebuilt on load.
+        keys, values, visits = self.items()
+        stamps = self.stamps[self.keys != 0] if self.stamps is not None else None
+        return {'config': (self.max_entries, self.policy, self.evict_fraction, self.max_load),
+                'keys': keys, 'values': values, 'visits': visits, 'stamps': stamps,
+                'clock': self.clock, 'evictions': self.evictions}
+
+    def __setstate__(self, state):
+        self.__init__(*state['config'])
+        self._reserve(len(state['keys']))
+        self.insert_many(state['keys'], state['values'], state['visits'], state['stamps'])
+        self.clock, self.evictions = state['clock'], state['evictions']
+
+    def _slot(self, key):
+        # Slot holding key, or the free slot where it would go.
+        keys, mask = self._keys, self.mask
+        i = key & mask
+        k = keys[i]
+        while k != key and k != 0:
+            i = (i + 1) & mask
+            k = keys[i]
+        return i
+
+    def get(self, key, default=0):
+        keys, mask = self._keys, self.mask
+        key = key or 1
+        i = key & mask
+        k = keys[i]
+        while k != key:
+            if k == 0:
+                self._last = (key, i)
+                return default
+            i = (i + 1) & mask
+            k = keys[i]
+        self._last = (key, i)
+        if self._stamps is not None:
+            self.clock += 1
+            self._stamps[i] = self.clock
+        return self._values[i]
+
+    def __contains__(self, key):
+        return self._keys[self._slot(key or 1)] != 0
+
+    def __getitem__(self, key):
+        i = self._slot(key or 1)
+        if self._keys[i] == 0:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        key = key or 1
+        last_key, i = self._last
+        # The remembered slot still holds key, or is still the first free slot on its path.
+        if last_key != key or self._keys[i] not in (key, 0):
+            i = self._slot(key)
+        if self._keys[i] == 0:
+            if self.count >= self.grow_at:
+                if self.capacity < self.max_capacity:
+                    self._resize(self.capacity * 2)
+                elif self.count >= self.max_entries:
+                    self.evict()
+                i = self._slot(key)
+            self._keys[i] = key
+            self.count += 1
+        self._values[i] = value
+        self._visits[i] += 1
+        if self._stamps is not None:
+            self.clock += 1
+            self._stamps[i] = self.clock
+
+    def items(self):
+        # (keys, values, visits) of the stored entries, as arrays.
+        live = self.keys != 0
+        return self.keys[live], self.values[live], self.visits[live]
+
+    def _reserve(self, n):
+        # Grows the table, within max_capacity, until n more keys fit under the load limit.
+        capacity = self.capacity
+        while capacity < self.max_capacity and self.count + n > capacity * self.max_load:
+            capacity *= 2
+        if capacity != self.capacity:
+            self._resize(capacity)
+
+    def _resize(self, capacity):
+        slots = np.flatnonzero(self.keys)
+        keys, values, visits = self.keys[slots], self.values[slots], self.visits[slots]
+        stamps = self.stamps[slots] if self.stamps is not None else None
+        self._allocate(capacity)
+        self.count = 0
+        self.insert_many(keys, values, visits, stamps)
+
+    def lookup_many(self, keys):
+        # Slot of every key, or -1 where it is not stored; probing rounds as in insert_many.
+        keys = np.array(keys, np.uint64)
+        keys[keys == 0] = 1
+        slots = (keys & np.uint64(self.mask)).astype(np.int64)
+        found = np.full(len(keys), -1, np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            k = self.keys[slots[pending]]
+            hit = k == keys[pending]
+            found[pending[hit]] = slots[pending[hit]]
+            pending = pending[~hit & (k != 0)]
+            slots[pending] = (slots[pending] + 1) & self.mask
+        return found
+
+    def add_many(self, keys, deltas, visits=None):
+        # Adds deltas to the values of (distinct) keys, missing keys starting from 0. Evicts first
+        # when the new keys would not fit; beyond max_entries new keys are dropped.
+        keys = np.array(keys, np.uint64)
+        keys[keys == 0] = 1
+        deltas = np.asarray(deltas, np.float32)
+        visits = np.ones(len(keys), np.uint32) if visits is None else np.asarray(visits, np.uint32)
+        slots = self.lookup_many(keys)
+        overflow = self.count + int(np.count_nonzero(slots < 0)) - self.max_entries
+        if overflow > 0:
+            self.evict(max(overflow, int(self.max_entries * self.evict_fraction)))
+            slots = self.lookup_many(keys)
+        capacity = self.capacity
+        self._reserve(min(int(np.count_nonzero(slots < 0)), self.max_entries - self.count))
+        if self.capacity != capacity:
+            slots = self.lookup_many(keys)
+        old = slots >= 0
+        self.values[slots[old]] += deltas[old]
+        self.visits[slots[old]] += visits[old]
+        stamps = None
+        if self.stamps is not None:
+            self.clock += 1
+            self.stamps[slots[old]] = self.clock
+            stamps = np.full(len(keys), self.clock, np.uint64)
+        new = np.flatnonzero(~old)[:self.max_entries - self.count]
+        self.insert_many(keys[new], deltas[new], visits[new], stamps[new] if stamps is not None else None)
+
+    def evict(self, n=None):
+        # Drops the n (default evict_fraction of max_entries) lowest scoring entries and rehashes.
+        n = max(1, int(self.max_entries * self.evict_fraction)) if n is None else n
+        live = np.flatnonzero(self.keys)
+        n = min(n, len(live))
+        score = self.visits[live] if self.policy == 'visits' else self.stamps[live]
+        keep = live[np.argpartition(score, n - 1)[n:]] if n else live
+        self._rebuild(keep)
+        self.evictions += n
+
+    def _rebuild(self, slots):
+        self._last = (None, 0)
+        keys, values, visits = self.keys[slots], self.values[slots], self.visits[slots]
+        stamps = self.stamps[slots] if self.stamps is not None else None
+        self.keys[:] = 0
+        self.values[:] = 0
+        self.visits[:] = 0
+        if stamps is not None:
+            self.stamps[:] = 0
+        self.count = 0
+        self.insert_many(keys, values, visits, stamps)
+
+    def insert_many(self, keys, values, visits=None, stamps=None):
+        # Stores new keys (not already present) in probing rounds: each round, every pending key
+        # tries its current slot, one key wins each free slot and the others move one slot on.
+        keys = np.array(keys, np.uint64)
+        keys[keys == 0] = 1
+        if self.count + len(keys) > self.capacity - 1:
+            raise ValueError("insert_many would overfill the table")
+        slots = (keys & np.uint64(self.mask)).astype(np.int64)
+        pending = np.arange(len(keys))
+        while len(pending):
+            free = self.keys[slots[pending]] == 0
+            _, first = np.unique(slots[pending[free]], return_index=True)
+            won = pending[free][first]
+            self.keys[slots[won]] = keys[won]
+            self.values[slots[won]] = np.asarray(values, np.float32)[won]
+            if visits is not None:
+                self.visits[slots[won]] = np.asarray(visits)[won]
+            if stamps is not None and self.stamps is not None:
+                self.stamps[slots[won]] = np.asarray(stamps)[won]
+            placed = np.zeros(len(keys), bool)
+            placed[won] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & self.mask
+        self.count += len(keys)
+
+
+def benchmark(max_entries=200_000, ops=500_000, seed=0):
+    # Random updates over twice max_entries distinct keys: dict against QTable, per second.
+    rng = np.random.default_rng(seed)
+    keys = [int(k) for k in rng.integers(1, 2**63, 2 * max_entries, dtype=np.uint64)]
+    picks = rng.integers(0, len(keys), ops)
+    results = {}
+    for name, table in (('dict', {}), ('QTable', QTable(max_entries))):
+        start = time.perf_counter()
+        for j in picks:
+            k = keys[j]
+            table[k] = table.get(k, 0) + 1.0
+        results[name] = ops / (time.perf_counter() - start)
+        if isinstance(table, QTable):
+            results['stats'] = table.stats()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the bounded Q-value store against a dict.')
+    parser.add_argument('--max-entries', type=int, default=200_000)
+    parser.add_argument('--ops', type=int, default=500_000)
+    args = parser.parse_args(argv)
+    results = benchmark(args.max_entries, args.ops)
+    print(f"dict: {results['dict']:,.0f} updates/s   QTable: {results['QTable']:,.0f} updates/s")
+    print(results['stats'])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# Endgame tablebases for MiniChessEnv6x6 by retrograde analysis.
+#
+# One table per material signature (pieces of each side), e.g. "wR_bNP": an int16 array over
+# every placement of the pieces and both sides to move. From the side to move's point of view:
+#   d + 1   win, the game ends after d more plies with best play
+#   -(d+1)  loss in d plies
+#   0       neither side can force an end (under the env's MAX_TURNS rule, material decides)
+# The tables ignore the turn limit; best_move() accounts for it when given the plies left.
+# Positions with two pieces on one square hold ILLEGAL.
+# Index: sum(square[i] * 36**i for each piece in signature order) * 2 + (0 if White to move else 1),
+# with square = x*6 + y, white pieces first, each side's pieces sorted by type.
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+from env_minichess import PAWN, ROOK, KNIGHT, WHITE, BLACK, PIECE_VALUES
+
+N_SQUARES = 36
+ILLEGAL = -32768
+UNKNOWN = 32767
+WIN, DRAW, LOSS = 1, 0, -1
+LETTERS = {PAWN: 'P', ROOK: 'R', KNIGHT: 'N'}
+MAX_TABLE_PIECES = 4
+
+
+def _knight_targets(sq):
+    x, y = divmod(sq, 6)
+    return [(x+dx)*6 + y+dy for dx, dy in [(2,1),(1,2),(-1,2),(-2,1),(-2,-1),(-1,-2),(1,-2),(2,-1)]
+            if 0 <= x+dx < 6 and 0 <= y+dy < 6]
+
+def _rook_rays(sq):
+    x, y = divmod(sq, 6)
+    rays = []
+    for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
+        ray = []
+        nx, ny = x + dx, y + dy
+        while 0 <= nx < 6 and 0 <= ny < 6:
+            ray.append(nx*6 + ny)
+            nx, ny = nx + dx, ny + dy
+        if ray:
+            rays.append(ray)
+    return rays
+
+def _pawn_moves(sq, color):
+    # (push target or None, [capture targets]); pawns never promote and stop on the last rank.
+    x, y = divmod(sq, 6)
+    nx = x - 1 if color == WHITE else x + 1
+    if not 0 <= nx < 6:
+        return None, []
+    return nx*6 + y, [nx*6 + ny for ny in (y-1, y+1) if 0 <= ny < 6]
+
+KNIGHT_TARGETS = [_knight_targets(sq) for sq in range(N_SQUARES)]
+ROOK_RAYS = [_rook_rays(sq) for sq in range(N_SQUARES)]
+MATERIAL = np.array([PIECE_VALUES.get(p, 0) for p in range(4)])
+PAWN_MOVES = {color: [_pawn_moves(sq, color) for sq in range(N_SQUARES)] for color in (WHITE, BLACK)}
+
+
+def signature_name(white, black):
+    return 'w' + ''.join(LETTERS[t] for t in white) + '_b' + ''.join(LETTERS[t] for t in black)
+
+def signatures(max_pieces):
+    # Every (white, black) material with at least one piece a side, smallest first.
+    sigs = []
+    for total in range(2, max_pieces + 1):
+        for n_white in range(1, total):
+            for white in itertools.combinations_with_replacement((PAWN, ROOK, KNIGHT), n_white):
+                for black in itertools.combinations_with_replacement((PAWN, ROOK, KNIGHT), total - n_white):
+                    sigs.append((white, black))
+    return sigs
+
+
+def generate_table(white, black, smaller):
+    # smaller maps every signature with one piece less to its finished table.
+    types = white + black
+    colors = [WHITE] * len(white) + [BLACK] * len(black)
+    k = len(types)
+    n = N_SQUARES ** k
+    pos = np.arange(n, dtype=np.int64)
+    squares = [(pos // N_SQUARES**i) % N_SQUARES for i in range(k)]
+    legal = np.ones(n, dtype=bool)
+    for i, j in itertools.combinations(range(k), 2):
+        legal &= squares[i] != squares[j]
+
+    src, dst, ext_src, ext_val = [], [], [], []
+    for i in range(k):
+        color = colors[i]
+        side = 0 if color == WHITE else 1
+        enemies = [j for j in range(k) if colors[j] != color]
+        for origin in range(N_SQUARES):
+            at = np.nonzero(legal & (squares[i] == origin))[0]
+            if not len(at):
+                continue
+            sub = [s[at] for s in squares]
+            # (target, may move there when empty, may capture there, squares that must be empty)
+            if types[i] == KNIGHT:
+                moves = [(t, True, True, ()) for t in KNIGHT_TARGETS[origin]]
+            elif types[i] == ROOK:
+                moves = [(t, True, True, tuple(ray[:s])) for ray in ROOK_RAYS[origin] for s, t in enumerate(ray)]
+            else:
+                push, captures = PAWN_MOVES[color][origin]
+                moves = ([(push, True, False, ())] if push is not None else []) + [(t, False, True, ()) for t in captures]
+            for target, quiet_ok, capture_ok, path in moves:
+                free = np.ones(len(at), dtype=bool)
+                for p in path:
+                    for j in range(k):
+                        if j != i:
+                            free &= sub[j] != p
+                empty = free.copy()
+                for j in range(k):
+                    if j != i:
+                        empty &= sub[j] != target
+                if quiet_ok:
+                    m = at[empty]
+                    src.append(m * 2 + side)
+                    dst.append((m + (target - origin) * N_SQUARES**i) * 2 + (1 - side))
+                if not capture_ok:
+                    continue
+                for j in enemies:
+                    hit = free & (sub[j] == target)
+                    if not hit.any():
+                        continue
+                    m = at[hit]
+                    rest = [r for r in range(k) if r != j]
+                    if len(enemies) == 1:
+                        # Last enemy piece taken: the opponent has lost on the spot.
+                        ext_src.append(m * 2 + side)
+                        ext_val.append(np.full(len(m), -1, dtype=np.int16))
+                        continue
+                    sub_white = tuple(types[r] for r in rest if colors[r] == WHITE)
+                    sub_black = tuple(types[r] for r in rest if colors[r] == BLACK)
+                    index = np.zeros(len(m), dtype=np.int64)
+                    for slot, r in enumerate(rest):
+                        index += (target if r == i else sub[r][hit]) * N_SQUARES**slot
+                    ext_src.append(m * 2 + side)
+                    ext_val.append(np.asarray(smaller[sub_white, sub_black][index * 2 + (1 - side)]))
+
+    size = 2 * n
+    src = np.concatenate(src) if src else np.zeros(0, np.int64)
+    dst = np.concatenate(dst) if dst else np.zeros(0, np.int64)
+    ext_src = np.concatenate(ext_src) if ext_src else np.zeros(0, np.int64)
+    ext_val = np.concatenate(ext_val) if ext_val else np.zeros(0, np.int16)
+    all_src = np.concatenate([src, ext_src])
+    degree = np.bincount(all_src, minlength=size)
+
+    values = np.full(size, UNKNOWN, dtype=np.int16)
+    values[~np.repeat(legal, 2)] = ILLEGAL
+    # Side to move without a move: the env ends the game on material.
+    stuck = (degree == 0) & (values == UNKNOWN)
+    material = sum(PIECE_VALUES[t] * (1 if c == WHITE else -1) for t, c in zip(types, colors))
+    own = np.where(np.arange(size) % 2 == 0, material, -material)
+    values[stuck] = np.sign(own[stuck]).astype(np.int16)
+
+    longest_ext = int(np.abs(ext_val[ext_val != 0]).max()) if (ext_val != 0).any() else 0
+    d = 1
+    while True:
+        succ = np.concatenate([values[dst], ext_val])
+        unresolved = values == UNKNOWN
+        # Win in d plies: a move to a position the opponent loses in d - 1.
+        win = unresolved & (np.bincount(all_src[succ == -d], minlength=size) > 0)
+        # Loss in d plies: every move reaches an opponent win, the longest in d - 1.
+        wins = np.bincount(all_src[(succ > 0) & (succ <= d)], minlength=size)
+        loss = unresolved & ~win & (degree > 0) & (wins == degree)
+        values[win] = d + 1
+        values[loss] = -(d + 1)
+        if not win.any() and not loss.any() and d > longest_ext:
+            break
+        d += 1
+    values[values == UNKNOWN] = 0
+    return values
+
+
+def generate(directory, max_pieces=3, log=None):
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for white, black in signatures(max_pieces):
+        start = time.perf_counter()
+        values = generate_table(white, black, tables)
+        tables[white, black] = values
+        np.save(os.path.join(directory, signature_name(white, black) + '.npy'), values)
+        if log is not None:
+            legal = values[values != ILLEGAL]
+            print(f"{signature_name(white, black):10} {len(legal):8} positions  win {np.sum(legal > 0):7}  "
+                  f"draw {np.sum(legal == 0):7}  loss {np.sum(legal < 0):7}  {time.perf_counter() - start:.2f}s", file=log)
+    return tables
+
+
+def material_balance(board, color_board, color):
+    # color's material minus the opponent's.
+    values = MATERIAL[board]
+    return int(values[color_board == color].sum() - values[color_board == -color].sum())
+
+
+class MiniChessTablebase:
+    # Probes tables written by generate(); each is memory-mapped the first time it is needed.
+    def __init__(self, directory='tablebase'):
+        self.directory = directory
+        self.tables = {}
+
+    def table(self, white, black):
+        key = (white, black)
+        if key not in self.tables:
+            path = os.path.join(self.directory, signature_name(white, black) + '.npy')
+            self.tables[key] = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+        return self.tables[key]
+
+    def probe(self, board, color_board, current_player):
+        # (WIN / DRAW / LOSS for current_player, plies to the end), or None when not covered.
+        # The tables assume every coloured square holds a piece: the start position's empty
+        # coloured squares (row 4 and row 1 centre) change the rules until a piece clears them.
+        occupied = np.count_nonzero(color_board)
+        if occupied > MAX_TABLE_PIECES or occupied != np.count_nonzero(board):
+            return None
+        pieces = sorted((0 if color_board[x][y] == WHITE else 1, board[x][y], x*6 + y)
+                        for x, y in zip(*np.nonzero(color_board)))
+        white = tuple(t for c, t, _ in pieces if c == 0)
+        black = tuple(t for c, t, _ in pieces if c == 1)
+        if not white or not black:
+            return None
+        table = self.table(white, black)
+        if table is None:
+            return None
+        index = sum(sq * N_SQUARES**i for i, (_, _, sq) in enumerate(pieces))
+        v = int(table[index * 2 + (0 if current_player == WHITE else 1)])
+        if v == 0:
+            return DRAW, 0
+        return (WIN, v - 1) if v > 0 else (LOSS, -v - 1)
+
+    def best_move(self, board, color_board, current_player, moves, turns_left=None):
+        # The move keeping the best result: fastest win, else a draw, else slowest loss.
+        # turns_left: plies still allowed before the env's turn limit, this move included. A
+        # result that would come later is decided on material like a draw. Draws go to the move
+        # leaving the most material ahead, which is how the env scores them at the limit.
+        # None when the position is not in the tables.
+        if self.probe(board, color_board, current_player) is None:
+            return None
+        best, best_key = None, None
+        for move in moves:
+            (x1, y1), (x2, y2) = move
+            b, c = board.copy(), color_board.copy()
+            b[x2][y2], c[x2][y2] = b[x1][y1], current_player
+            b[x1][y1], c[x1][y1] = 0, 0
+            if not np.any(c == -current_player):
+                return move
+            result = self.probe(b, c, -current_player)
+            if result is None:
+                continue
+            outcome, plies = -result[0], result[1]
+            if turns_left is not None and plies + 1 > turns_left:
+                outcome = DRAW
+            if outcome == DRAW:
+                key = (DRAW, material_balance(b, c, current_player))
+            else:
+                key = (outcome, -plies if outcome == WIN else plies)
+            if best_key is None or key > best_key:
+                best, best_key = move, key
+        return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate MiniChess 6x6 endgame tablebases.')
+    parser.add_argument('--max-pieces', type=int, default=3, help='4 takes about ten minutes, 2 GB of memory and 650 MB of disk')
+    parser.add_argument('--dir', default='tablebase')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    tables = generate(args.dir, args.max_pieces, log=sys.stdout)
+    print(f"{len(tables)} tables written to {args.dir} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
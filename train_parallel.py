@@ -0,0 +1,199 @@
+# Self-play Q-learning for the 6x6 minichess over a pool of worker processes.
+#
+# Workers play chunks of episodes with their own seeds, learning into a local overlay on top of
+# the last snapshot of the shared tables, and send back per-key Q-value deltas. The learner keeps
+# one bounded QTable per colour; every sync_every episodes it merges the deltas it received (the
+# mean delta of the chunks that touched a key) and writes a new snapshot. A snapshot is one
+# (2, n) uint64 .npy file per colour, sorted keys then their values as float64 bits, so keys and
+# values are replaced together atomically and both rows stay contiguous for binary search. The
+# workers memory-map it, so every process shares one copy through the page cache.
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from env_minichess import MiniChessEnv6x6, WHITE, MAX_TURNS
+from agent_qlearning import QLearningAgent
+from qtable import QTable
+
+COLORS = ('white', 'black')
+
+
+class Snapshot:
+    # Read-only Q-values from a snapshot file, looked up by binary search.
+    def __init__(self, path=None):
+        data = np.load(path, mmap_mode='r') if path is not None else np.zeros((2, 0), np.uint64)
+        # Plain ndarray views: np.memmap's subclass overhead shows up on every lookup.
+        self.keys = data[0].view(np.ndarray)
+        self.values = data[1].view(np.ndarray).view(np.float64)
+
+    def get(self, key, default=0):
+        i = int(self.keys.searchsorted(np.uint64(key)))
+        if i < len(self.keys) and self.keys[i] == key:
+            return float(self.values[i])
+        return default
+
+
+class DeltaTable:
+    # A worker's Q-table: its own updates since the last result, over the snapshot.
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.values = {}
+        self.visits = {}
+
+    def get(self, key, default=0):
+        value = self.values.get(key)
+        return self.snapshot.get(key, default) if value is None else value
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+        self.visits[key] = self.visits.get(key, 0) + 1
+
+    def take_deltas(self):
+        # (keys, deltas against the snapshot, update counts) as arrays; starts a new batch.
+        keys = np.fromiter(self.values, np.uint64, len(self.values))
+        deltas = np.array([v - self.snapshot.get(k, 0) for k, v in self.values.items()], np.float32)
+        visits = np.fromiter(self.visits.values(), np.uint32, len(self.visits))
+        self.values, self.visits = {}, {}
+        return keys, deltas, visits
+
+
+def write_snapshot(table, path):
+    keys, values, _ = table.items()
+    order = np.argsort(keys)
+    data = np.stack([keys[order], values[order].astype(np.float64).view(np.uint64)])
+    tmp = path + '.tmp.npy'
+    np.save(tmp, data)
+    os.replace(tmp, path)
+
+
+def merge_deltas(table, results):
+    # Adds to table, per key, the mean of the deltas of the results that touched it.
+    if not results:
+        return
+    keys = np.concatenate([r[0] for r in results])
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, np.concatenate([r[1] for r in results]).astype(np.float64), len(unique))
+    counts = np.bincount(inverse, minlength=len(unique))
+    visits = np.bincount(inverse, np.concatenate([r[2] for r in results]), len(unique))
+    table.add_many(unique, sums / counts, np.minimum(visits, np.iinfo(np.uint32).max))
+
+
+def play_episode(env, agents):
+    # One self-play game; agents maps WHITE / BLACK to the agent playing that side.
+    state = env.get_state()
+    valid_moves = env.get_valid_moves()
+    key = env.key
+    done = False
+    turn = 0
+    while not done:
+        agent = agents[state[2]]
+        action = agent.choose_action(state, valid_moves, key, MAX_TURNS - env.turn_count)
+        if action is None:
+            break
+        next_state, reward, done, next_valid_moves = env.step(action)
+        agent.learn(state, action, reward, next_state, done, next_valid_moves, key, env.key)
+        state, valid_moves, key = next_state, next_valid_moves, env.key
+        turn += 1
+    return turn
+
+
+_worker = {}
+
+def _init_worker(snapshot_dir, alpha, gamma, epsilon, tablebase_dir):
+    # The env announces every game's end; workers keep quiet.
+    sys.stdout = open(os.devnull, 'w')
+    tablebase = None
+    if tablebase_dir is not None and os.path.isdir(tablebase_dir):
+        from tablebase_minichess import MiniChessTablebase
+        tablebase = MiniChessTablebase(tablebase_dir)
+    _worker['paths'] = {c: os.path.join(snapshot_dir, f'snapshot_{c}.npy') for c in COLORS}
+    _worker['stamps'] = {}
+    _worker['agents'] = {c: QLearningAgent(alpha, gamma, epsilon, tablebase, DeltaTable(Snapshot()))
+                         for c in COLORS}
+
+def _refresh_snapshots():
+    for color, path in _worker['paths'].items():
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if _worker['stamps'].get(color) != stamp:
+            _worker['stamps'][color] = stamp
+            _worker['agents'][color].q_table.snapshot = Snapshot(path)
+
+def run_chunk(job):
+    # Plays n episodes seeded with seed; returns (episodes, plies, deltas per colour).
+    seed, n = job
+    random.seed(seed)
+    _refresh_snapshots()
+    agents = _worker['agents']
+    sides = {WHITE: agents['white'], -WHITE: agents['black']}
+    plies = sum(play_episode(MiniChessEnv6x6(), sides) for _ in range(n))
+    return n, plies, {c: agents[c].q_table.take_deltas() for c in COLORS}
+
+
+def train(episodes, workers, chunk=50, sync_every=2000, save_every=50000, max_entries=10_000_000,
+          out_dir='model', alpha=0.1, gamma=0.99, epsilon=0.2, tablebase_dir='tablebase', seed=0, log=sys.stdout):
+    os.makedirs(out_dir, exist_ok=True)
+    tables = {c: QTable(max_entries) for c in COLORS}
+    paths = {c: os.path.join(out_dir, f'snapshot_{c}.npy') for c in COLORS}
+    for c in COLORS:
+        write_snapshot(tables[c], paths[c])
+
+    def save():
+        for c in COLORS:
+            QLearningAgent(q_table=tables[c]).save(os.path.join(out_dir, f'{c}_agent.pkl'))
+
+    # Chunk i gets seed + i, so a run is reproducible for a fixed worker count and timing.
+    jobs = ((seed + i, min(chunk, episodes - start)) for i, start in enumerate(range(0, episodes, chunk)))
+    pending = {c: [] for c in COLORS}
+    done = plies = since_sync = since_save = 0
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context()
+    with ctx.Pool(workers, _init_worker, (out_dir, alpha, gamma, epsilon, tablebase_dir)) as pool:
+        for n, p, deltas in pool.imap_unordered(run_chunk, jobs):
+            done += n
+            plies += p
+            since_sync += n
+            since_save += n
+            for c in COLORS:
+                pending[c].append(deltas[c])
+            if since_sync >= sync_every or done == episodes:
+                for c in COLORS:
+                    merge_deltas(tables[c], pending[c])
+                    pending[c] = []
+                    write_snapshot(tables[c], paths[c])
+                since_sync = 0
+            if since_save >= save_every or done == episodes:
+                save()
+                since_save = 0
+                elapsed = time.perf_counter() - start
+                if log is not None:
+                    print(f"{done} episodes  {done / elapsed:,.0f} episodes/s  {plies / elapsed:,.0f} plies/s  "
+                          f"white {tables['white'].stats()}  black {tables['black'].stats()}", file=log, flush=True)
+    return tables
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel self-play Q-learning for the 6x6 minichess.')
+    parser.add_argument('--episodes', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk', type=int, default=50, help='episodes per worker job')
+    parser.add_argument('--sync-every', type=int, default=2000, help='episodes between merges and snapshots')
+    parser.add_argument('--save-every', type=int, default=50000)
+    parser.add_argument('--max-entries', type=int, default=10_000_000, help='Q-values kept per colour')
+    parser.add_argument('--dir', default='model')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    train(args.episodes, args.workers, args.chunk, args.sync_every, args.save_every, args.max_entries,
+          args.dir, seed=args.seed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())